@@ -0,0 +1,226 @@
+# benchmark.py
+"""无界面性能基准：视频库扫描、缩略图生成吞吐量和界面线程的缩略图处理开销
+
+在 Linux 上以 QT_QPA_PLATFORM=offscreen 运行，例如：
+
+    python benchmark.py --categories 20 --files 100 --output bench.json
+    python benchmark.py --categories 20 --files 100 --baseline bench.json
+
+默认使用一个只写出固定 JPEG 的 ffmpeg 替身脚本，只衡量本程序自身的开销；
+加上 --ffmpeg /usr/bin/ffmpeg 则用 lavfi 生成真实的小视频并调用真实的 ffmpeg/ffprobe。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide2.QtWidgets import QApplication
+from PySide2.QtCore import QEventLoop, QTimer
+from PySide2.QtGui import QImage, QColor
+
+# 越大越好的指标，其余指标均为越小越好
+HIGHER_IS_BETTER = {'thumbnail_cold_per_second', 'thumbnail_warm_per_second'}
+
+STUB_FFMPEG = '''#!{python}
+# 基准测试用的 ffmpeg 替身：把固定的 JPEG 复制到每个 "-q:v N" 之后的输出路径
+import sys, shutil
+args = sys.argv[1:]
+for i, arg in enumerate(args):
+    if arg == '-q:v' and i + 2 < len(args):
+        shutil.copyfile({jpeg!r}, args[i + 2])
+'''
+
+STUB_FFPROBE = '''#!{python}
+# 基准测试用的 ffprobe 替身：输出固定的元数据
+print('{{"streams": [{{"codec_name": "h264", "width": 320, "height": 240}}], '
+      '"format": {{"duration": "60.0", "bit_rate": "500000"}}, '
+      '"packets": [{{"pts_time": "0.0", "flags": "K_"}}, {{"pts_time": "2.0", "flags": "K_"}}]}}')
+'''
+
+def write_script(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.chmod(path, 0o755)
+
+def prepare_tools(work_dir, ffmpeg):
+    """在临时“程序目录”中准备 bin/ffmpeg/ffmpeg.exe 和 ffprobe.exe（真实程序的链接或替身脚本）"""
+    tool_dir = os.path.join(work_dir, 'app', 'bin', 'ffmpeg')
+    os.makedirs(tool_dir, exist_ok=True)
+    ffmpeg_path, ffprobe_path = os.path.join(tool_dir, 'ffmpeg.exe'), os.path.join(tool_dir, 'ffprobe.exe')
+    if ffmpeg:
+        os.symlink(os.path.abspath(ffmpeg), ffmpeg_path)
+        ffprobe = shutil.which('ffprobe', path=os.path.dirname(os.path.abspath(ffmpeg))) or shutil.which('ffprobe')
+        if ffprobe: os.symlink(ffprobe, ffprobe_path)
+    else:
+        jpeg = os.path.join(work_dir, 'stub.jpg')
+        image = QImage(250, 140, QImage.Format_RGB32); image.fill(QColor(0, 120, 215)); image.save(jpeg, 'JPG')
+        write_script(ffmpeg_path, STUB_FFMPEG.format(python=sys.executable, jpeg=jpeg))
+        write_script(ffprobe_path, STUB_FFPROBE.format(python=sys.executable))
+    return ffmpeg_path, ffprobe_path if os.path.exists(ffprobe_path) else None
+
+def generate_library(root, categories, files, ffmpeg):
+    """生成 categories × files 的合成视频库；真实 ffmpeg 只编码一个 3 秒的小视频，其余复制"""
+    sample = os.path.join(root, '.sample.mp4')
+    os.makedirs(root, exist_ok=True)
+    if ffmpeg:
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=duration=3:size=320x240:rate=10',
+                        '-pix_fmt', 'yuv420p', sample], check=True)
+    else:
+        with open(sample, 'wb') as f:
+            f.write(b'\0' * 1024)
+    for c in range(categories):
+        category = os.path.join(root, f"分类{c:03}")
+        os.makedirs(category, exist_ok=True)
+        for i in range(files):
+            shutil.copyfile(sample, os.path.join(category, f"视频{i:04}.mp4"))
+    os.remove(sample)
+
+def wait_for(thread, timeout_s=3600):
+    """在事件循环中等待线程结束，这样线程发出的排队信号能被正常处理"""
+    loop = QEventLoop()
+    thread.finished.connect(loop.quit)
+    QTimer.singleShot(int(timeout_s * 1000), loop.quit)
+    if thread.isRunning():
+        loop.exec_()
+    QApplication.processEvents()
+
+def timed(func, repeat=1):
+    """执行 repeat 次并返回耗时的中位数（秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter(); func(); samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def run_benchmark(args):
+    app = QApplication.instance() or QApplication(sys.argv)  # 保留引用，基准运行期间 QApplication 不能被回收
+    work_dir = tempfile.mkdtemp(prefix='hbstd_bench_')
+    try:
+        ffmpeg_path, ffprobe_path = prepare_tools(work_dir, args.ffmpeg)
+        library_root = os.path.join(work_dir, 'videos')
+        generate_library(library_root, args.categories, args.files, args.ffmpeg)
+        app_dir = os.path.join(work_dir, 'app')
+        with open(os.path.join(app_dir, 'app_config.json'), 'w', encoding='utf-8') as f:
+            json.dump({'last_folder': library_root, 'thumbnail_workers': args.workers, 'vlc_warmup': 'lazy'}, f)
+
+        import main_window
+        from workers import ThumbnailWorker
+        from thumbnail_cache import ThumbnailCache
+        main_window.base_path = app_dir  # 配置、索引和缓存都放进临时目录
+        # 无界面运行时不能弹出模态对话框，错误信息改为直接打印
+        main_window.MainWindow.show_error_message = lambda self, message: print(message)
+        main_window.MainWindow.show_warning_message = lambda self, message: print(message)
+        metrics = {}
+
+        # 1. 启动（包括从空索引在后台完整扫描一次）以及 load_all_content 的两种路径
+        start = time.perf_counter()
+        window = main_window.MainWindow()
+        if window.library_scanner: wait_for(window.library_scanner)
+        metrics['startup_s'] = time.perf_counter() - start
+        window.stop_thumbnail_generation()
+
+        def load(use_index):
+            window.load_all_content(use_index=use_index)
+            if window.library_scanner: wait_for(window.library_scanner)  # 没有可用索引时在后台扫描
+            window.stop_thumbnail_generation()
+        metrics['load_all_content_rescan_s'] = timed(lambda: load(False), args.repeat)
+        metrics['load_all_content_index_s'] = timed(lambda: load(True), args.repeat)
+        video_files = window.all_video_files()
+
+        # 2. 缩略图生成吞吐量：冷缓存与热缓存
+        cache = ThumbnailCache(os.path.join(work_dir, 'bench_cache'))
+        thumbnails, media_info = {}, {}
+        def run_worker(library):
+            worker = ThumbnailWorker(video_files, cache, ffmpeg_path, args.workers, ffprobe_path, library=library)
+            worker.thumbnails_ready.connect(lambda batch: thumbnails.update(batch))
+            worker.metadata_ready.connect(lambda batch: media_info.update(batch))
+            final = {}
+            worker.stats_updated.connect(lambda stats: final.update(stats))
+            worker.start(); wait_for(worker)
+            return final
+        cold = run_worker(None)  # 不用索引：逐个读取文件状态并用 ffprobe 读取元数据
+        metrics['thumbnail_cold_s'] = cold['elapsed']
+        metrics['thumbnail_cold_per_second'] = cold['generated'] / cold['elapsed'] if cold['elapsed'] else 0.0
+        for p, info in media_info.items(): window.library.set_media_info(p, info)
+        warm = run_worker(window.library)  # 与程序中相同：文件状态和元数据都取自索引
+        metrics['thumbnail_warm_s'] = warm['elapsed']
+        metrics['thumbnail_warm_per_second'] = warm['cached'] / warm['elapsed'] if warm['elapsed'] else 0.0
+        metrics['thumbnail_failed'] = cold['failed']
+        cache.close()
+
+        # 3. 界面线程开销：登记缩略图（update_button_icon）与放入解码结果
+        items = sorted(thumbnails.items())
+        if items:
+            metrics['update_button_icon_us'] = timed(lambda: [window.update_button_icon(p, t) for p, t in items]) / len(items) * 1e6
+            decoded = [(p, window.thumbnail_decoder.decode(t)) for p, t in items[:window.pixmap_cache.max_items]]
+            metrics['insert_decoded_us'] = timed(lambda: window.on_thumbnails_decoded(decoded)) / len(decoded) * 1e6
+            metrics['decode_thumbnail_us'] = timed(lambda: [window.thumbnail_decoder.decode(t) for _, t in items[:50]]) / min(50, len(items)) * 1e6
+
+        window.close(); app.processEvents()
+        return {
+            'meta': {
+                'categories': args.categories, 'files': args.files, 'videos': len(video_files),
+                'workers': args.workers, 'ffmpeg': 'real' if args.ffmpeg else 'stub', 'repeat': args.repeat,
+                'python': platform.python_version(), 'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'metrics': metrics,
+        }
+    finally:
+        if not args.keep: shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare(result, baseline, tolerance):
+    """与基准结果逐项比较，返回退化的指标列表"""
+    regressions = []
+    for key in ('videos', 'workers', 'ffmpeg'):
+        if baseline.get('meta', {}).get(key) != result['meta'][key]:
+            print(f"警告：基准结果的 {key} 为 {baseline.get('meta', {}).get(key)}，本次为 {result['meta'][key]}，比较结果仅供参考")
+    print(f"{'指标':<32}{'基准':>14}{'本次':>14}{'变化':>10}")
+    for name, value in result['metrics'].items():
+        base = baseline.get('metrics', {}).get(name)
+        if base is None:
+            print(f"{name:<32}{'-':>14}{value:>14.4f}"); continue
+        change = (value - base) / base if base else (float('inf') if value > base else 0.0)
+        worse = -change if name in HIGHER_IS_BETTER else change
+        flag = ' !' if worse > tolerance else ''
+        print(f"{name:<32}{base:>14.4f}{value:>14.4f}{change:>+9.1%}{flag}")
+        if flag: regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="视频选择器无界面性能基准")
+    parser.add_argument('--categories', type=int, default=10, help="分类数量")
+    parser.add_argument('--files', type=int, default=50, help="每个分类的视频数量")
+    parser.add_argument('--workers', type=int, default=None, help="缩略图并发进程数，默认与 CPU 核心数一致")
+    parser.add_argument('--ffmpeg', default=None, help="真实 ffmpeg 的路径；不指定时使用替身脚本")
+    parser.add_argument('--repeat', type=int, default=3, help="扫描类测量的重复次数（取中位数）")
+    parser.add_argument('--output', default=None, help="把结果写入 JSON 文件")
+    parser.add_argument('--baseline', default=None, help="与之前保存的 JSON 结果比较")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的退化比例，默认 20%%")
+    parser.add_argument('--keep', action='store_true', help="保留生成的临时视频库和缓存")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"性能退化: {', '.join(regressions)}")
+            return 1
+    elif not args.output:
+        print(text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+# library_index.py
+import os
+import json
+import time
+import threading
+from PySide2.QtCore import QObject, QThread, Signal, QTimer, QFileSystemWatcher
+
+import perf_trace
+
+VIDEO_FORMATS = ('.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv')
+DEFAULT_MAX_DEPTH = 1        # 默认只把第一层子文件夹作为分类
+SCAN_FLUSH_INTERVAL = 0.1    # 后台扫描结果每 100ms 合并发给界面线程一次
+
+def _scan_dir(path, extensions=VIDEO_FORMATS):
+    """只 scandir 一次，返回 ({视频文件名: [大小, 修改时间ns]}, 按名称排序的子文件夹 DirEntry 列表)"""
+    files, subdirs = {}, []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                subdirs.append(entry)
+            elif entry.name.lower().endswith(extensions) and entry.is_file():
+                st = entry.stat()  # Windows 上直接取自目录列表，不需要额外的系统调用
+                files[entry.name] = [st.st_size, st.st_mtime_ns]
+    return files, sorted(subdirs, key=lambda e: e.name)
+
+def scan_category(path, extensions=VIDEO_FORMATS):
+    """扫描一个分类文件夹，返回 {文件名: [大小, 修改时间ns]}"""
+    return _scan_dir(path, extensions)[0]
+
+def walk_categories(root, max_depth=DEFAULT_MAX_DEPTH, extensions=VIDEO_FORMATS):
+    """遍历 root 下最多 max_depth 层的子文件夹，逐个产出 (分类名, {'mtime', 'files'})，分类名是相对 root 的路径
+
+    子文件夹先于父文件夹产出：父文件夹出现时已经知道它有没有子分类，只用来分组的文件夹不会先闪出一个空标签页。
+    """
+    def walk(entry, name, depth):
+        try:
+            with perf_trace.span('scan.category', 'scan', category=name):
+                mtime = entry.stat().st_mtime_ns  # 先取修改时间再列文件，列表期间的改动之后仍能被发现
+                files, subdirs = _scan_dir(entry.path, extensions)
+            perf_trace.count('scan.files', len(files))
+        except OSError as e:
+            print(f"扫描分类 {name} 失败: {e}"); return
+        if depth < max_depth:
+            for sub in subdirs:
+                yield from walk(sub, os.path.join(name, sub.name), depth + 1)
+        yield name, {'mtime': mtime, 'files': files}
+
+    for entry in _scan_dir(root, extensions)[1]:
+        yield from walk(entry, entry.name, 1)
+
+def diff_files(old, new):
+    """比较同一分类前后两次扫描的结果，返回 (新增, 删除, 改动, 改名{旧名: 新名})"""
+    added = [n for n in new if n not in old]
+    removed = [n for n in old if n not in new]
+    changed = [n for n in new if n in old and new[n] != old[n]]
+    # 大小和修改时间都相同的一删一增视为改名
+    renamed, by_stat = {}, {}
+    for n in removed: by_stat.setdefault(tuple(old[n]), []).append(n)
+    for n in list(added):
+        candidates = by_stat.get(tuple(new[n]))
+        if candidates:
+            old_name = candidates.pop(0); renamed[old_name] = n
+            added.remove(n); removed.remove(old_name)
+    return added, removed, changed, renamed
+
+class LibraryIndex:
+    """持久化的视频库索引（分类、文件、大小、修改时间），保存在 app_config.json 旁边
+
+    分类名是文件夹相对根目录的路径，max_depth 决定最多把几层子文件夹作为分类。
+    """
+    def __init__(self, index_path, max_depth=DEFAULT_MAX_DEPTH, extensions=VIDEO_FORMATS):
+        self.index_path = index_path
+        self.max_depth, self.extensions = max_depth, tuple(extensions)
+        self.root = ''  # 同时清空下面的文件夹 -> 分类名对照表
+        self.categories = {}  # 分类名 -> {'mtime': 文件夹修改时间ns, 'files': {文件名: [大小, 修改时间ns]}}
+        self.media = {}       # 视频完整路径 -> ffprobe 元数据（附带读取时的大小和修改时间）
+
+    def load(self):
+        """读取索引；扫描设置（层数、扩展名）与生成索引时不同则只保留元数据并返回 False"""
+        if not os.path.exists(self.index_path): return False
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.media = data.get('media', {})
+            if data.get('max_depth', DEFAULT_MAX_DEPTH) != self.max_depth or tuple(data.get('extensions', VIDEO_FORMATS)) != self.extensions:
+                print("扫描设置已改变，需要重新扫描视频库"); return False
+            self.root, self.categories = data.get('root', ''), data.get('categories', {})
+            return True
+        except Exception as e:
+            print(f"加载视频库索引失败: {e}")
+            return False
+
+    def save(self):
+        try:
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'root': self.root, 'max_depth': self.max_depth, 'extensions': list(self.extensions),
+                           'categories': self.categories, 'media': self.media}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"保存视频库索引失败: {e}")
+
+    @property
+    def root(self):
+        return self._category_names[0]
+
+    @root.setter
+    def root(self, root):
+        # (根目录, {文件夹路径: 分类名})：一起替换，后台线程读到的根目录和对照表总是匹配的
+        self._category_names = (root, {})
+
+    def category_path(self, name):
+        return os.path.join(self.root, name)
+
+    def video_files(self, name):
+        """分类下所有视频的完整路径（已排序）"""
+        path = self.category_path(name)
+        return [os.path.join(path, f) for f in sorted(self.categories.get(name, {}).get('files', {}))]
+
+    def category_of(self, video_path):
+        """视频所在的分类名；每个文件夹只调用一次 os.path.relpath，之后查对照表（绘制每一行时都会用到）"""
+        root, names = self._category_names
+        folder = os.path.dirname(video_path)
+        name = names.get(folder)
+        if name is None:
+            name = names[folder] = os.path.relpath(folder, root)
+        return name
+
+    def stat(self, video_path):
+        """索引中记录的 [大小, 修改时间ns]，未收录时返回 None"""
+        return self.categories.get(self.category_of(video_path), {}).get('files', {}).get(os.path.basename(video_path))
+
+    def media_info(self, video_path):
+        """已缓存的元数据；视频在读取之后被改动过则视为没有"""
+        info, stat = self.media.get(video_path), self.stat(video_path)
+        if info is None or stat is None or [info.get('size'), info.get('mtime')] != list(stat):
+            return None
+        return info
+
+    def set_media_info(self, video_path, info):
+        stat = self.stat(video_path)
+        if stat is not None:
+            self.media[video_path] = dict(info, size=stat[0], mtime=stat[1])
+
+    def move_media(self, old_path, new_path):
+        """视频改名后沿用原来的元数据"""
+        info = self.media.pop(old_path, None)
+        if info is not None: self.media[new_path] = info
+
+    def listed_categories(self):
+        """要显示为标签页的分类（已排序）：有视频的文件夹和没有子分类的文件夹，只用来分组的文件夹不显示"""
+        parents = {os.path.dirname(n) for n in self.categories}
+        return [n for n in sorted(self.categories) if self.categories[n].get('files') or n not in parents]
+
+    def depth(self, name):
+        return name.count(os.sep) + 1 if name else 0
+
+    def child_names(self, name=''):
+        """磁盘上 name（空字符串为根目录）的直接子文件夹；已到最大层数时为空"""
+        if self.depth(name) >= self.max_depth: return []
+        with os.scandir(self.category_path(name)) as it:
+            return sorted(os.path.join(name, e.name) for e in it if e.is_dir())
+
+    def list_category_names(self, parent=''):
+        """parent 之下（不含 parent 本身）的全部分类文件夹；子文件夹读取失败时跳过"""
+        names, stack = [], self.child_names(parent)
+        while stack:
+            name = stack.pop(); names.append(name)
+            try:
+                stack.extend(self.child_names(name))
+            except OSError as e:
+                print(f"扫描分类 {name} 失败: {e}")
+        return sorted(names)
+
+    def prune_media(self):
+        """删除已不在库中的视频的元数据"""
+        live = {p for name in self.categories for p in self.video_files(name)}
+        self.media = {p: info for p, info in self.media.items() if p in live}
+
+    def scan(self, name):
+        path = self.category_path(name)
+        return {'mtime': os.stat(path).st_mtime_ns, 'files': scan_category(path, self.extensions)}
+
+class LibraryScanner(QThread):
+    """在后台线程遍历视频库，分批发出扫描到的分类；第一个分类立即发出，随时可以取消"""
+    categories_found = Signal(list)  # [(分类名, 分类数据), ...]
+
+    def __init__(self, root, max_depth=DEFAULT_MAX_DEPTH, extensions=VIDEO_FORMATS, parent=None):
+        super().__init__(parent)
+        self.root, self.max_depth, self.extensions = root, max_depth, tuple(extensions)
+        self.error = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        perf_trace.name_thread('library-scanner')
+        with perf_trace.span('scan.library', 'scan', root=self.root):
+            self._scan()
+
+    def _scan(self):
+        batch, last_flush = [], 0.0
+        try:
+            for item in walk_categories(self.root, self.max_depth, self.extensions):
+                if self._cancelled:
+                    return
+                batch.append(item)
+                if time.monotonic() - last_flush >= SCAN_FLUSH_INTERVAL:
+                    self.categories_found.emit(batch)
+                    batch, last_flush = [], time.monotonic()
+        except OSError as e:
+            self.error = e; return
+        if batch and not self._cancelled:
+            self.categories_found.emit(batch)
+
+class LibraryWatcher(QObject):
+    """监视视频库目录，合并短时间内的多次变动后只重新扫描发生变化的文件夹
+
+    QFileSystemWatcher 无法监视的目录（如部分网络共享）退回到定时比较文件夹修改时间。
+    比较和重新扫描都在后台线程中进行，结果回到界面线程后再逐个发出信号；同一时间只有一轮在进行。
+    """
+    category_changed = Signal(str, dict)  # 分类名, 新的分类数据
+    category_removed = Signal(str)
+    polled = Signal()  # 一轮完整比较（poll）的结果已全部发出，索引与磁盘一致
+    _reconciled = Signal(int, bool, list)  # 由后台线程发出：(第几轮监视, 是否完整比较, [(分类名, 新的分类数据，已删除时为 None)])
+
+    def __init__(self, index, poll_interval=30, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self._changed, self._full_check = set(), False  # 待核对的文件夹，以及是否要比较全部文件夹
+        self._busy, self._generation = False, 0
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._debounce = QTimer(self); self._debounce.setSingleShot(True); self._debounce.setInterval(500)
+        self._debounce.timeout.connect(self.reconcile_dirty)
+        self._poll_timer = QTimer(self); self._poll_timer.setInterval(int(poll_interval * 1000))
+        self._poll_timer.timeout.connect(self.poll)
+        self._reconciled.connect(self._on_reconciled)
+
+    def start(self):
+        self.stop()
+        paths = [self.index.root] + [self.index.category_path(n) for n in self.index.categories]
+        failed = [p for p in paths if not self._watcher.addPath(p)]
+        if failed:
+            print(f"无法监视 {len(failed)} 个目录，改为每 {self._poll_timer.interval() // 1000} 秒轮询")
+            self._poll_timer.start()
+
+    def stop(self):
+        """停止监视；正在后台进行的一轮核对的结果会被丢弃"""
+        self._poll_timer.stop(); self._debounce.stop()
+        self._changed, self._full_check = set(), False
+        self._generation += 1
+        watched = self._watcher.directories()
+        if watched: self._watcher.removePaths(watched)
+
+    def poll(self):
+        """比较各文件夹的修改时间，只重新扫描有变化的文件夹"""
+        self._full_check = True
+        self.reconcile_dirty()
+
+    def _on_directory_changed(self, path):
+        name = os.path.relpath(path, self.index.root)
+        self._changed.add('' if name == os.curdir else name)
+        self._debounce.start()
+
+    def reconcile_dirty(self):
+        """在后台线程核对有变化的文件夹；上一轮还没结束时等它结束后再开始"""
+        if self._busy or not (self._changed or self._full_check): return
+        changed, full_check = self._changed, self._full_check
+        self._changed, self._full_check, self._busy = set(), False, True
+        known = {name: info['mtime'] for name, info in self.index.categories.items()}
+        generation = self._generation
+
+        def run():
+            results = []
+            try:
+                results = self._collect(known, changed, full_check)
+            finally:
+                self._reconciled.emit(generation, full_check, results)
+        threading.Thread(target=run, name='library-watcher', daemon=True).start()
+
+    def _collect(self, known, changed, full_check):
+        """在后台线程中运行：找出需要重新扫描的分类并扫描，known 为开始时索引中各分类的修改时间"""
+        dirty = set()
+        if full_check:
+            try:
+                names = set(self.index.list_category_names())
+            except OSError as e:
+                print(f"扫描视频库失败: {e}"); names = set(known)
+            for name in names | set(known):
+                try:
+                    if name not in known or name not in names or os.stat(self.index.category_path(name)).st_mtime_ns != known[name]:
+                        dirty.add(name)
+                except OSError:
+                    dirty.add(name)
+        for name in changed:
+            if name: dirty.add(name)
+            # 文件夹的变化也可能是子分类的增删，比较直接子文件夹列表
+            try:
+                children = set(self.index.child_names(name))
+            except OSError:
+                children = set()
+            dirty.update(children.symmetric_difference(n for n in known if os.path.dirname(n) == name))
+
+        results, pending, seen, gone = [], sorted(dirty), set(), set()
+        while pending:
+            name = pending.pop(0)
+            if name in seen: continue
+            seen.add(name)
+            if not os.path.isdir(self.index.category_path(name)):
+                # 连同所有子分类一起移除，先子后父
+                removed = [n for n in known if (n == name or n.startswith(name + os.sep)) and n not in gone]
+                gone.update(removed)
+                results.extend((n, None) for n in sorted(removed, reverse=True))
+                continue
+            try:
+                info = self.index.scan(name)
+            except OSError as e:
+                print(f"扫描分类 {name} 失败: {e}"); continue
+            if name not in known:
+                # 新出现的文件夹里可能已经带着子分类
+                try:
+                    pending.extend(self.index.list_category_names(name))
+                except OSError:
+                    pass
+            results.append((name, info))
+        return results
+
+    def _on_reconciled(self, generation, full_check, results):
+        self._busy = False
+        if generation == self._generation:
+            for name, info in results:
+                path = self.index.category_path(name)
+                if info is None:
+                    if name not in self.index.categories: continue
+                    self._watcher.removePath(path)
+                    self.category_removed.emit(name)
+                else:
+                    if name not in self.index.categories: self._watcher.addPath(path)
+                    self.category_changed.emit(name, info)
+            if full_check: self.polled.emit()
+        self.reconcile_dirty()  # 核对期间又发生的变化
@@ -2,6 +2,9 @@
 import sys
 import os
 
+# 0. 最先开始记录启动时间线
+import startup_timeline
+
 # 1. 导入 PySide2 模块
 # 所有 PySide6 的引用已全部更改为 PySide2
 from PySide2.QtWidgets import QApplication
@@ -27,23 +30,11 @@ if sys.platform.startswith('win32'):
     os.environ['VLC_PLUGIN_PATH'] = os.path.join(vlc_dll_path, 'plugins')
 
 
-# 3. 尝试导入vlc模块 (已增强错误处理)
-try:
-    import vlc
-except ImportError as e:
-    from PySide2.QtWidgets import QMessageBox
-    # 在显示任何UI元素（如QMessageBox）之前，必须先创建一个QApplication实例
-    app = QApplication(sys.argv)
-    QMessageBox.critical(None, "VLC库加载错误",
-                         f"无法导入或加载VLC模块: {e}\n\n"
-                         "请确认以下几点：\n"
-                         "1. 项目 'bin/vlc' 目录下是否包含了 libvlc.dll 等文件。\n"
-                         "2. 您的 Python 和 VLC 的架构是否完全一致 (例如：同为64位或同为32位)。\n"
-                         "3. 您的系统是否已安装了VLC所需的 VC++ 运行库。")
-    sys.exit(1)
+# 3. vlc 模块不在这里导入：主窗口显示之后才在后台加载，加载失败时再提示
 
 # 4. 导入主窗口
 from main_window import MainWindow
+startup_timeline.mark('imports')
 
 # 5. 启动应用
 if __name__ == '__main__':
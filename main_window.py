@@ -2,14 +2,22 @@
 import os
 import sys
 import json
+import threading
 from PySide2.QtWidgets import (QWidget, QVBoxLayout, QTabWidget, QFileDialog, 
-                               QLabel, QMessageBox, QScrollArea, QGridLayout, 
-                               QToolButton, QStackedWidget, QAction)
-from PySide2.QtCore import Qt, QSize, QTimer
-from PySide2.QtGui import QFont, QIcon, QMovie, QPalette, QBrush, QImage, QKeySequence
+                               QLabel, QMessageBox, QStackedWidget, QAction, QLineEdit)
+from PySide2.QtCore import Qt, QPoint, QTimer, QEvent, QThread, Signal
+from PySide2.QtGui import QFont, QMovie, QPalette, QBrush, QImage, QKeySequence, QGuiApplication
 
-from workers import ThumbnailWorker
-from player_widget import PlayerWidget
+from workers import ThumbnailWorker, ThumbnailDecoder, SpriteWorker
+from thumbnail_cache import ThumbnailCache, DEFAULT_BUDGET_BYTES
+from library_index import LibraryIndex, LibraryWatcher, LibraryScanner, VIDEO_FORMATS, DEFAULT_MAX_DEPTH, diff_files
+from video_grid import PixmapCache, VideoListModel, VideoGridView, DurationRole
+from media_probe import DEFAULT_SEEK_PERCENT
+from title_search import TitleIndex
+from sprite_sheet import SPRITE_KEY_SUFFIX
+import startup_timeline
+import perf_trace
+# player_widget 会导入 vlc，推迟到窗口显示之后再导入
 
 def get_base_path():
     if getattr(sys, 'frozen', False):
@@ -28,21 +36,52 @@ def get_config_path():
         # 开发环境，配置文件放在项目目录
         return os.path.join(base_path, 'app_config.json')
 
+def get_library_index_path():
+    """视频库索引与配置文件放在同一目录"""
+    return os.path.join(os.path.dirname(get_config_path()), 'library_index.json')
+
+def get_perf_path(name):
+    """性能追踪文件（perf_trace.json、perf_metrics.log）也放在配置文件旁边"""
+    return os.path.join(os.path.dirname(get_config_path()), name)
+
 class MainWindow(QWidget):
+    _vlc_instance_ready = Signal()  # 后台线程创建好 vlc.Instance（或失败）后发出
+    _title_index_ready = Signal()   # 后台线程重建好标题索引后发出
+
     def __init__(self):
         super().__init__()
+        # 背景图只解码一次；改变大小时合并 50ms 内的多次触发再缩放
+        self.background_path, self._background_image = os.path.join(base_path, 'resources', 'background.jpg'), None
+        self.background_timer = QTimer(self); self.background_timer.setSingleShot(True); self.background_timer.setInterval(50)
+        self.background_timer.timeout.connect(self.update_background)
         
         # 修正路径：区分开发环境和打包环境
         if getattr(sys, 'frozen', False): # 打包后的环境
             self.ffmpeg_path = os.path.join(base_path, 'ffmpeg.exe')
         else: # 开发环境
             self.ffmpeg_path = os.path.join(base_path, 'bin', 'ffmpeg', 'ffmpeg.exe')
+        # ffprobe 与 ffmpeg 放在同一目录；缺少时只是不读取时长等信息
+        self.ffprobe_path = os.path.join(os.path.dirname(self.ffmpeg_path), 'ffprobe.exe')
+        if not os.path.exists(self.ffprobe_path): print(f"警告：未找到 ffprobe.exe：{self.ffprobe_path}"); self.ffprobe_path = None
 
         # 在打包后，将缓存文件夹创建在 .exe 旁边，而不是临时目录里
         cache_base = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else base_path
         self.thumbnail_cache_dir = os.path.join(cache_base, '.thumb_cache')
         
-        self.root_folder, self.video_buttons, self.thumbnail_worker = "", {}, None
+        self.root_folder, self.thumbnail_worker, self.library_scanner, self.sprite_worker = "", None, None, None
+        # 已停止但还没结束的缩略图线程：保留引用直到 finished，界面线程不等待它们
+        self._retired_workers = set()
+        # 缓存清理在后台线程进行，只在分类列表完整时（扫描结束或启动后首次核对完成）开始
+        self._gc_thread, self._gc_after_poll = None, False
+        self.config, self.category_tabs, self.thumbnail_cache = {}, {}, None
+        self.library = LibraryIndex(get_library_index_path())
+        # 播放器在首帧绘制之后才创建：vlc.Instance() 会扫描整个插件目录
+        self.player_widget, self._vlc_thread, self._vlc_result = None, None, None
+        self._vlc_instance_ready.connect(self.create_player)
+        # 搜索用的标题索引在后台线程重建，库有变化时合并 500ms 内的多次触发
+        self.title_index, self._title_thread = TitleIndex(), None
+        self._title_index_ready.connect(self.refresh_search)
+        self.first_paint_tasks = []  # 启动时推迟到窗口显示之后再做的工作
         
         # 禁用加载动画
         self.loading_movie = None
@@ -54,15 +93,59 @@ class MainWindow(QWidget):
         
         self.init_ui()
         self.apply_stylesheet()
-        self.set_background_image(os.path.join(base_path, 'resources', 'background.jpg'))
         self.showFullScreen()
+        QTimer.singleShot(0, self.on_first_paint)
     
-    def set_background_image(self, image_path):
-        if not os.path.exists(image_path): print(f"警告：背景图片未找到：{image_path}"); return
-        palette = self.palette(); image = QImage(image_path)
-        brush = QBrush(image.scaled(self.size(), Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation))
+    def on_first_paint(self):
+        """窗口已经显示：再加载背景图，并按配置在后台预热 VLC（vlc_warmup 为 "lazy" 时等到第一次播放）"""
+        startup_timeline.mark('window_shown')
+        self.update_background()
+        tasks, self.first_paint_tasks = self.first_paint_tasks, []
+        for task in tasks: task()
+        if self.config.get('vlc_warmup', 'background') != 'lazy': self.start_vlc_warmup()
+    def update_background(self):
+        if self._background_image is None:
+            if not os.path.exists(self.background_path): print(f"警告：背景图片未找到：{self.background_path}")
+            self._background_image = QImage(self.background_path)
+        if self._background_image.isNull(): return
+        palette = self.palette()
+        brush = QBrush(self._background_image.scaled(self.size(), Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation))
         palette.setBrush(QPalette.Window, brush); self.setPalette(palette); self.setAutoFillBackground(True)
-    def resizeEvent(self, event): self.set_background_image(os.path.join(base_path, 'resources', 'background.jpg')); super().resizeEvent(event)
+    def resizeEvent(self, event):
+        if self._background_image is not None: self.background_timer.start()
+        super().resizeEvent(event)
+    
+    def start_vlc_warmup(self):
+        """在后台线程导入 vlc 并创建 vlc.Instance()，完成后回到界面线程创建播放器"""
+        if self._vlc_thread or self.player_widget: return
+        def warmup():
+            try:
+                import vlc
+                self._vlc_result = vlc.Instance()
+            except Exception as e:  # ImportError，或 libvlc.dll 加载失败时的 OSError
+                self._vlc_result = e
+            self._vlc_instance_ready.emit()
+        self._vlc_thread = threading.Thread(target=warmup, name='vlc-warmup', daemon=True); self._vlc_thread.start()
+    def ensure_player(self):
+        """需要播放器时调用：预热尚未完成就在这里等它完成"""
+        if not self.player_widget:
+            self.start_vlc_warmup(); self._vlc_thread.join(); self.create_player()
+        return self.player_widget
+    def create_player(self):
+        if self.player_widget: return
+        if isinstance(self._vlc_result, Exception): self.show_vlc_error(self._vlc_result); return
+        from player_widget import PlayerWidget
+        self.player_widget = PlayerWidget(self.config.get('media_pool_size', 8), self._vlc_result)
+        self.player_widget.back_to_browser_requested.connect(self.return_to_browser); self.stacked_widget.addWidget(self.player_widget)
+        startup_timeline.mark('vlc_ready'); startup_timeline.report()
+    def show_vlc_error(self, error):
+        QMessageBox.critical(self, "VLC库加载错误",
+                             f"无法导入或加载VLC模块: {error}\n\n"
+                             "请确认以下几点：\n"
+                             "1. 项目 'bin/vlc' 目录下是否包含了 libvlc.dll 等文件。\n"
+                             "2. 您的 Python 和 VLC 的架构是否完全一致 (例如：同为64位或同为32位)。\n"
+                             "3. 您的系统是否已安装了VLC所需的 VC++ 运行库。")
+        QGuiApplication.exit(1)
     
     def load_config(self):
         """加载配置文件"""
@@ -70,8 +153,8 @@ class MainWindow(QWidget):
         if os.path.exists(config_path):
             try:
                 with open(config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    return config.get('last_folder', '')
+                    self.config = json.load(f)
+                    return self.config.get('last_folder', '')
             except Exception as e:
                 print(f"加载配置文件失败: {e}")
         return ''
@@ -80,14 +163,19 @@ class MainWindow(QWidget):
         """保存配置文件"""
         config_path = get_config_path()
         try:
-            config = {'last_folder': folder_path}
+            self.config['last_folder'] = folder_path
             with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+                json.dump(self.config, f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"保存配置文件失败: {e}")
     
     def init_ui(self):
-        self.setWindowTitle("科普视频选择器");main_layout = QVBoxLayout(self); main_layout.setContentsMargins(20, 20, 20, 20);self.stacked_widget = QStackedWidget();self.stacked_widget.setStyleSheet("background: transparent;");main_layout.addWidget(self.stacked_widget);self.browser_widget = QWidget();self.browser_widget.setStyleSheet("background: transparent;");browser_layout = QVBoxLayout(self.browser_widget); browser_layout.setContentsMargins(0, 0, 0, 0);self.tab_widget = QTabWidget();self.tab_widget.setDocumentMode(True); self.tab_widget.tabBar().setExpanding(True);self.initial_label = QLabel("正在等待选择视频文件夹..."); self.initial_label.setAlignment(Qt.AlignCenter);browser_layout.addWidget(self.tab_widget); browser_layout.addWidget(self.initial_label);self.player_widget = PlayerWidget();self.player_widget.back_to_browser_requested.connect(self.return_to_browser);self.stacked_widget.addWidget(self.browser_widget); self.stacked_widget.addWidget(self.player_widget);
+        last_folder = self.load_config()  # 先读配置，下面创建的组件会用到其中的参数
+        # 分类层数和视频扩展名可在配置中修改，改动后索引会自动重新扫描
+        self.library.max_depth = max(1, int(self.config.get('category_depth', DEFAULT_MAX_DEPTH)))
+        self.library.extensions = tuple(e.lower() for e in self.config.get('video_extensions', VIDEO_FORMATS))
+        self.setWindowTitle("科普视频选择器");main_layout = QVBoxLayout(self); main_layout.setContentsMargins(20, 20, 20, 20);self.stacked_widget = QStackedWidget();self.stacked_widget.setStyleSheet("background: transparent;");main_layout.addWidget(self.stacked_widget);self.browser_widget = QWidget();self.browser_widget.setStyleSheet("background: transparent;");browser_layout = QVBoxLayout(self.browser_widget); browser_layout.setContentsMargins(0, 0, 0, 0);self.tab_widget = QTabWidget();self.tab_widget.setDocumentMode(True); self.tab_widget.tabBar().setExpanding(True);self.initial_label = QLabel("正在等待选择视频文件夹..."); self.initial_label.setAlignment(Qt.AlignCenter);browser_layout.addWidget(self.tab_widget); browser_layout.addWidget(self.initial_label);self.stacked_widget.addWidget(self.browser_widget);
+        self.stacked_widget.currentChanged.connect(self.update_sprite_pause)  # 进入或离开播放器时暂停或恢复生成雪碧图
         
         # 添加重新选择文件夹的快捷键 Ctrl+N
         self.reselect_action = QAction(self)
@@ -95,17 +183,57 @@ class MainWindow(QWidget):
         self.reselect_action.triggered.connect(self.prompt_for_folder)
         self.addAction(self.reselect_action)
         
+        # 切换标签页或滚动时，让可见视频的缩略图优先生成（合并 100ms 内的多次触发）
+        self.thumbnail_focus_timer = QTimer(self); self.thumbnail_focus_timer.setSingleShot(True); self.thumbnail_focus_timer.setInterval(100)
+        self.thumbnail_focus_timer.timeout.connect(self.update_thumbnail_focus)
+        self.tab_widget.currentChanged.connect(lambda index: self.thumbnail_focus_timer.start())
+        
+        # 缩略图在后台线程解码，界面线程每帧只接收一批现成的 QImage
+        self.thumbnail_decoder = ThumbnailDecoder(QGuiApplication.primaryScreen().devicePixelRatio())
+        self.thumbnail_decoder.images_ready.connect(self.on_thumbnails_decoded)
+        self.thumbnail_decoder.start()
+        self.pixmap_cache = PixmapCache(self.config.get('pixmap_cache_items', 200), self.thumbnail_decoder.request, self.resolve_thumbnail)
+        # 元数据陆续到达，合并 2 秒内的多次更新再写回索引文件
+        self.index_save_timer = QTimer(self); self.index_save_timer.setSingleShot(True); self.index_save_timer.setInterval(2000)
+        self.index_save_timer.timeout.connect(self.library.save)
+        self.library_watcher = LibraryWatcher(self.library, self.config.get('library_poll_interval', 30), self)
+        self.library_watcher.category_changed.connect(self.on_category_changed)
+        self.library_watcher.category_removed.connect(self.on_category_removed)
+        self.library_watcher.polled.connect(self.on_library_polled)
+        
+        # 在浏览界面直接输入文字即可搜索全部分类；结果显示在单独的网格中，各分类的标签页保持不变
+        self.search_edit = QLineEdit(); self.search_edit.setObjectName("search_edit"); self.search_edit.setPlaceholderText("搜索视频标题或拼音首字母，Esc 关闭"); self.search_edit.hide()
+        self.search_edit.textChanged.connect(self.run_search); self.search_edit.installEventFilter(self)
+        self.search_model = VideoListModel(self.pixmap_cache, self.library.media_info, self)
+        self.search_view = VideoGridView(self.search_model); self.search_view.placeholder_text = "没有找到匹配的视频。"; self.search_view.hide()
+        self.search_view.video_activated.connect(self.play_video); self.search_view.video_hovered.connect(self.prewarm_media); self.search_view.text_typed.connect(self.open_search)
+        self.search_view.verticalScrollBar().valueChanged.connect(lambda value: self.thumbnail_focus_timer.start())
+        browser_layout.insertWidget(0, self.search_edit); browser_layout.addWidget(self.search_view)
+        self.title_index_timer = QTimer(self); self.title_index_timer.setSingleShot(True); self.title_index_timer.setInterval(500)
+        self.title_index_timer.timeout.connect(self.rebuild_title_index)
+        
+        # 性能追踪：配置 perf_trace 为 true 时启动即开启；隐藏快捷键 Ctrl+Shift+F12 打开实时计数浮层（同时开启追踪）
+        self.stall_monitor = perf_trace.StallMonitor(self)
+        self.metrics_log = perf_trace.MetricsLog(get_perf_path('perf_metrics.log'))
+        self.metrics_timer = QTimer(self); self.metrics_timer.setInterval(int(self.config.get('perf_log_interval', 10) * 1000)); self.metrics_timer.timeout.connect(self.metrics_log.write)
+        self.perf_overlay = QLabel(self, Qt.Tool | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint); self.perf_overlay.setAttribute(Qt.WA_ShowWithoutActivating); self.perf_overlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.perf_overlay.setFont(QFont("Consolas", 10)); self.perf_overlay.setStyleSheet("background: rgba(0, 0, 0, 0.8); color: #00FF80; padding: 8px;"); self.perf_overlay.hide()
+        self.perf_overlay_timer = QTimer(self); self.perf_overlay_timer.setInterval(500); self.perf_overlay_timer.timeout.connect(self.update_perf_overlay)
+        self.perf_action = QAction(self); self.perf_action.setShortcut(QKeySequence("Ctrl+Shift+F12")); self.perf_action.setShortcutContext(Qt.ApplicationShortcut)
+        self.perf_action.triggered.connect(self.toggle_perf_overlay); self.addAction(self.perf_action)
+        if self.config.get('perf_trace'): self.enable_perf_trace()
+        
         # 先尝试加载上次的文件夹
-        last_folder = self.load_config()
         if last_folder and os.path.exists(last_folder):
             self.root_folder = last_folder
             self.initial_label.hide()
             self.tab_widget.show()
-            self.load_all_content()
+            self.load_all_content(use_index=True)
         else:
             QTimer.singleShot(100, self.prompt_for_folder)
     
     def prompt_for_folder(self):
+        scanning = self.cancel_scan()  # 选择文件夹期间不再继续读取原来的（可能很慢的）文件夹
         start_path = os.path.join(os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else base_path, 'videos')
         folder = QFileDialog.getExistingDirectory(self, "请选择存放视频的主文件夹", start_path if os.path.exists(start_path) else os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else base_path)
         if folder: 
@@ -117,52 +245,290 @@ class MainWindow(QWidget):
         elif not self.root_folder:  # 只有在没有已选择的文件夹时才退出
             QMessageBox.warning(self, "操作取消", "您没有选择文件夹，程序将退出。")
             self.close()
+        elif scanning: self.load_all_content()  # 取消了选择：重新扫描被中断的原文件夹
     def return_to_browser(self): self.stacked_widget.setCurrentWidget(self.browser_widget)
-    def load_all_content(self):
-        if self.thumbnail_worker and self.thumbnail_worker.isRunning(): self.thumbnail_worker.stop(); self.thumbnail_worker.wait()
-        self.tab_widget.clear(); self.video_buttons.clear()
+    def load_all_content(self, use_index=False):
+        """构建全部分类标签页；use_index 为 True 且索引可用时直接使用上次保存的索引，随后只核对有变化的文件夹；
+        否则在后台线程扫描，每发现一批分类就添加标签页"""
+        perf_trace.instant('library.load_all_content', 'scan', use_index=use_index)
+        self.cancel_scan(); self.stop_thumbnail_generation(); self.library_watcher.stop(); self.close_search()
+        if self.sprite_worker: self.sprite_worker.clear()
+        self.tab_widget.clear(); self.category_tabs.clear(); self.pixmap_cache.clear()
         try:
-            subfolders = [f.name for f in os.scandir(self.root_folder) if f.is_dir()]
-            if not subfolders: self.show_warning_message("选择的文件夹内没有找到任何子文件夹。"); return
-            all_video_files = []
-            for category_name in sorted(subfolders):
-                category_path = os.path.join(self.root_folder, category_name);scroll_area, grid_layout = self.create_tab_layout();video_files = self.find_videos_in_path(category_path);all_video_files.extend(video_files)
-                if not video_files: grid_layout.addWidget(QLabel("此分类下没有视频文件。"), 0, 0, Qt.AlignCenter)
-                else:
-                    columns = 4
-                    for i, video_path in enumerate(video_files): button = self.create_video_button(video_path); grid_layout.addWidget(button, i // columns, i % columns); self.video_buttons[video_path] = button
-                self.tab_widget.addTab(scroll_area, category_name)
-            if all_video_files: self.start_thumbnail_generation(all_video_files)
+            if not (use_index and self.library.load() and self.library.root == self.root_folder): self.start_scan(); return
+            if not self.library.categories: self.show_warning_message("选择的文件夹内没有找到任何子文件夹。"); return
+            self.sync_tabs()
+            self.start_thumbnail_generation()
+            self.library_watcher.start()
+            self._gc_after_poll = True  # 索引可能已过时：等首次核对把改名、删除都合并进来之后再清理缓存
+            QTimer.singleShot(0, self.library_watcher.poll)
         except Exception as e: self.show_error_message(f"加载内容时发生错误: {e}")
-    def create_tab_layout(self):
-        scroll_area = QScrollArea(); scroll_area.setWidgetResizable(True); scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff);scroll_area.setStyleSheet("background: transparent; border: none;");content_widget = QWidget(); content_widget.setStyleSheet("background: transparent;");scroll_area.setWidget(content_widget);grid_layout = QGridLayout(content_widget); grid_layout.setSpacing(30); grid_layout.setContentsMargins(30, 30, 30, 30);return scroll_area, grid_layout
-    def find_videos_in_path(self, path):
-        formats = ('.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv');return sorted([os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(formats)])
-    def create_video_button(self, video_path):
-        button = QToolButton(); button.setToolButtonStyle(Qt.ToolButtonTextUnderIcon);button.setIconSize(QSize(250, 140)); button.setFixedSize(QSize(270, 200));button.setText(os.path.splitext(os.path.basename(video_path))[0]); button.setFont(QFont("Microsoft YaHei", 11))
-        button.clicked.connect(lambda: self.play_video(video_path)); return button
-    def start_thumbnail_generation(self, video_files):
-        self.thumbnail_worker = ThumbnailWorker(video_files, self.thumbnail_cache_dir, self.ffmpeg_path)
-        self.thumbnail_worker.thumbnail_ready.connect(self.update_button_icon)
+    def start_scan(self):
+        self.library.root, self.library.categories = self.root_folder, {}
+        scanner = self.library_scanner = LibraryScanner(self.root_folder, self.library.max_depth, self.library.extensions, self)
+        scanner.categories_found.connect(lambda batch: self.on_categories_found(scanner, batch))
+        scanner.finished.connect(lambda: self.on_scan_finished(scanner))
+        scanner.start()
+    def cancel_scan(self):
+        """取消正在进行的后台扫描（不等待当前文件夹读完），返回是否确实取消了"""
+        scanner, self.library_scanner = self.library_scanner, None
+        if not (scanner and scanner.isRunning()): return False
+        scanner.cancel(); return True
+    def on_categories_found(self, scanner, batch):
+        if scanner is not self.library_scanner: return  # 已取消的扫描遗留的结果
+        with perf_trace.span('scan.apply_batch', 'gui', categories=len(batch)):
+            for category_name, info in batch: self.library.categories[category_name] = info
+            self.sync_tabs()
+            self.enqueue_thumbnails([p for category_name, _ in batch for p in self.library.video_files(category_name)])
+    def on_scan_finished(self, scanner):
+        scanner.deleteLater()
+        if scanner is not self.library_scanner: return
+        self.library_scanner = None
+        if scanner.error: self.show_error_message(f"加载内容时发生错误: {scanner.error}"); return
+        self.library.prune_media(); self.library.save()
+        if not self.library.categories: self.show_warning_message("选择的文件夹内没有找到任何子文件夹。"); return
+        self.library_watcher.start()
+        self.collect_thumbnail_garbage()
+    def all_video_files(self):
+        return [p for name in sorted(self.library.categories) for p in self.library.video_files(name)]
+    def sync_tabs(self):
+        """让标签页与索引中要显示的分类保持一致，只增删有变化的标签页"""
+        listed = self.library.listed_categories()
+        for category_name in set(self.category_tabs).difference(listed): self.remove_category_tab(category_name)
+        for category_name in listed:
+            if category_name not in self.category_tabs: self.add_category_tab(category_name)
+        if self.category_tabs: startup_timeline.mark('first_tab')
+        self.title_index_timer.start()
+    def rebuild_title_index(self):
+        """在后台线程重建标题索引，完成后刷新正在显示的搜索结果"""
+        if self._title_thread and self._title_thread.is_alive(): self.title_index_timer.start(); return  # 等上一次重建结束
+        video_files = self.all_video_files()
+        def build(): self.title_index.build(video_files); self._title_index_ready.emit()
+        self._title_thread = threading.Thread(target=build, name='title-index', daemon=True); self._title_thread.start()
+    def open_search(self, text=''):
+        """打开搜索栏，并把触发搜索的文字接在已有的查询后面"""
+        if self.stacked_widget.currentWidget() is not self.browser_widget or not self.root_folder: return
+        self.search_edit.show(); self.search_edit.setFocus()
+        if text: self.search_edit.setText(self.search_edit.text() + text)
+    def close_search(self):
+        if self.search_edit.isHidden(): return
+        self.search_edit.clear(); self.search_edit.hide()
+        if self.tab_widget.currentWidget(): self.tab_widget.currentWidget().setFocus()
+    def run_search(self, text):
+        searching = bool(text.strip())
+        with perf_trace.span('search.query', 'gui'):
+            self.search_model.set_videos(self.title_index.search(text) if searching else [], reset=True)
+        self.tab_widget.setVisible(not searching); self.search_view.setVisible(searching)
+        self.search_view.scrollToTop(); self.thumbnail_focus_timer.start()
+    def refresh_search(self):
+        if self.search_edit.text().strip(): self.run_search(self.search_edit.text())
+    def remove_category_tab(self, category_name):
+        view = self.category_tabs.pop(category_name)
+        self.tab_widget.removeTab(self.tab_widget.indexOf(view)); view.deleteLater()
+    def add_category_tab(self, category_name):
+        model = VideoListModel(self.pixmap_cache, self.library.media_info, self); model.set_videos(self.library.video_files(category_name))
+        view = VideoGridView(model); view.video_activated.connect(self.play_video); self.category_tabs[category_name] = view
+        view.video_hovered.connect(self.prewarm_media); view.text_typed.connect(self.open_search)
+        view.verticalScrollBar().valueChanged.connect(lambda value: self.thumbnail_focus_timer.start())
+        self.tab_widget.insertTab(sorted(self.category_tabs).index(category_name), view, category_name.replace(os.sep, ' / '))
+    def on_category_changed(self, category_name, info):
+        """文件监视器发现某个分类有变化：只增删受影响的行，并只为新增或改动的视频生成缩略图"""
+        old_files = self.library.categories.get(category_name, {}).get('files', {})
+        added, removed, changed, renamed = diff_files(old_files, info['files'])
+        is_new = category_name not in self.library.categories
+        self.library.categories[category_name] = info; self.index_save_timer.start()
+        self.sync_tabs()  # 新分类，或者分组文件夹里放进了视频
+        category_path = self.library.category_path(category_name)
+        if is_new: self.enqueue_thumbnails(self.library.video_files(category_name)); return
+        if not (added or removed or changed or renamed): return
+        for name in removed + list(renamed): self.pixmap_cache.forget(os.path.join(category_path, name))
+        view = self.category_tabs.get(category_name)
+        if view: view.model().set_videos(self.library.video_files(category_name))
+        missing = [os.path.join(category_path, n) for n in added + changed]
+        for old_name, new_name in renamed.items():
+            old_path, new_path = os.path.join(category_path, old_name), os.path.join(category_path, new_name)
+            if self.carry_over_renamed(old_path, new_path, old_files[old_name]): missing.append(new_path)
+        self.enqueue_thumbnails(missing)
+    def carry_over_renamed(self, old_path, new_path, stat):
+        """改名的视频沿用原来的缩略图、雪碧图和元数据；返回是否仍缺少其中之一，需要交给后台处理"""
+        cache = self.ensure_thumbnail_cache()
+        cache.rename(old_path, new_path, cache.key_for(old_path, *stat), cache.key_for(new_path, *stat))
+        self.library.move_media(old_path, new_path)
+        thumb_path = cache.lookup(cache.key_for(new_path, *stat))
+        if thumb_path: self.update_button_icon(new_path, thumb_path)
+        return not thumb_path or (self.library.media_info(new_path) is None and self.ffprobe_path is not None)
+    def on_category_removed(self, category_name):
+        for video_path in self.library.video_files(category_name): self.pixmap_cache.forget(video_path)
+        del self.library.categories[category_name]; self.index_save_timer.start()
+        self.sync_tabs()  # 移除对应标签页；失去全部子分类的分组文件夹重新显示出来
+    def start_thumbnail_generation(self, video_files=None):
+        """为 video_files（默认为全部视频）准备缩略图。哪些视频缺缩略图或元数据由后台线程对照索引和缓存清单判断，
+        界面线程不逐个查询；已有的缩略图在网格绘制到对应行时由 resolve_thumbnail 取得"""
+        # 启动时窗口还没显示：等首次绘制之后再打开缓存清单、启动后台线程
+        if not self.isVisible(): self.first_paint_tasks.append(lambda: self.start_thumbnail_generation(video_files)); return
+        if self.thumbnail_cache is None:
+            self.ensure_thumbnail_cache()
+            view = self.tab_widget.currentWidget()
+            if view: view.viewport().update()  # 缓存清单刚打开，已显示的行重新取缩略图
+        self.thumbnail_worker = ThumbnailWorker(self.all_video_files() if video_files is None else video_files, self.thumbnail_cache, self.ffmpeg_path, self.config.get('thumbnail_workers'),
+                                                self.ffprobe_path, self.config.get('thumbnail_seek_percent', DEFAULT_SEEK_PERCENT), self.library)
+        self.thumbnail_worker.thumbnails_ready.connect(self.on_thumbnails_ready)
+        self.thumbnail_worker.metadata_ready.connect(self.on_metadata_ready)
         self.thumbnail_worker.error_occurred.connect(self.show_error_message)
-        self.thumbnail_worker.start()
+        self.thumbnail_worker.stats_updated.connect(self.on_thumbnail_stats)
+        self.update_thumbnail_focus()
+        self.thumbnail_worker.finished.connect(self.update_sprite_pause)
+        self.thumbnail_worker.start(); self.update_sprite_pause()
+    def resolve_thumbnail(self, video_path):
+        """网格第一次绘制某个视频时查缓存清单；大小和修改时间取自索引，不读取文件状态"""
+        stat = self.library.stat(video_path)
+        if stat is None or self.thumbnail_cache is None: return None
+        return self.thumbnail_cache.lookup(self.thumbnail_cache.key_for(video_path, *stat))
+    def ensure_thumbnail_cache(self):
+        if self.thumbnail_cache is None:
+            self.thumbnail_cache = ThumbnailCache(self.thumbnail_cache_dir, self.config.get('thumbnail_cache_bytes', DEFAULT_BUDGET_BYTES))
+        return self.thumbnail_cache
+    def ensure_sprite_worker(self):
+        if self.sprite_worker is None:
+            self.sprite_worker = SpriteWorker(self.ensure_thumbnail_cache(), self.ffmpeg_path, self.library)
+            self.sprite_worker.sprite_ready.connect(self.on_sprite_ready); self.update_sprite_pause(); self.sprite_worker.start(QThread.LowPriority)
+        return self.sprite_worker
+    def start_sprite_generation(self):
+        """缩略图处理完之后，在后台为全部视频预先生成拖动预览用的雪碧图（已缓存的直接跳过）"""
+        self.ensure_sprite_worker().enqueue(self.all_video_files())
+    def update_sprite_pause(self):
+        """播放期间（与播放器争抢磁盘）和缩略图还没处理完时暂停生成雪碧图"""
+        if not self.sprite_worker: return
+        thumbnailing = self.thumbnail_worker is not None and self.thumbnail_worker.isRunning()
+        self.sprite_worker.set_paused(thumbnailing or self.stacked_widget.currentWidget() is not self.browser_widget)
+    def request_sprite(self, video_path):
+        """为正在播放的视频取雪碧图：已缓存时直接交给播放器，否则只把它排到后台队列的最前面"""
+        stat, cache = self.library.stat(video_path), self.ensure_thumbnail_cache()
+        sheet_path = cache.lookup(cache.key_for(video_path, *stat) + SPRITE_KEY_SUFFIX) if stat else None
+        if sheet_path: self.on_sprite_ready(video_path, sheet_path)
+        else: self.ensure_sprite_worker().request(video_path)
+    def on_sprite_ready(self, video_path, sheet_path):
+        if self.player_widget: self.player_widget.set_sprite(video_path, sheet_path)
+    def enqueue_thumbnails(self, video_files):
+        if not video_files: return
+        if not (self.thumbnail_worker and self.thumbnail_worker.enqueue(video_files)):
+            self.stop_thumbnail_generation()  # 原来的线程已处理完队列、正在退出：不等它，直接开新的
+            self.start_thumbnail_generation(video_files)
+    def stop_thumbnail_generation(self):
+        """停止当前的缩略图线程但不等待它结束；引用保留到 finished 发出，避免线程还在运行时对象被回收"""
+        worker, self.thumbnail_worker = self.thumbnail_worker, None
+        if not worker: return
+        worker.stop(); self._retired_workers.add(worker)
+        worker.finished.connect(lambda: self._retired_workers.discard(worker))
+        if worker.isFinished(): self._retired_workers.discard(worker)  # 连接之前就已经结束
+    def collect_thumbnail_garbage(self):
+        """在后台线程按完整的视频列表清理缩略图缓存里的孤立条目；同一时间只进行一次"""
+        if self._gc_thread and self._gc_thread.is_alive(): return
+        cache, live_videos = self.ensure_thumbnail_cache(), self.all_video_files()
+        def collect():
+            removed = cache.collect_garbage(live_videos)
+            if removed: print(f"缩略图缓存清理了 {removed} 个孤立条目")
+        self._gc_thread = threading.Thread(target=collect, name='thumbnail-gc', daemon=True); self._gc_thread.start()
+    def on_library_polled(self):
+        if self._gc_after_poll: self._gc_after_poll = False; self.collect_thumbnail_garbage()
+    def update_thumbnail_focus(self):
+        """把当前标签页及其可见按钮的缩略图任务提到队列最前面"""
+        view = self.search_view if not self.search_view.isHidden() else self.tab_widget.currentWidget()
+        if not self.thumbnail_worker or view is None: return
+        self.thumbnail_worker.set_focus(view.model().videos(), view.visible_videos())
+    def on_thumbnail_stats(self, stats):
+        perf_trace.gauge('thumbnail.queue_depth', stats['queue_depth']); perf_trace.gauge('thumbnail.per_second', round(stats['per_second'], 2))
+        if stats.get('finished'):
+            print(f"缩略图生成结束: 新生成 {stats['generated']} 个, 缓存命中 {stats['cached']} 个, 失败 {stats['failed']} 个, "
+                  f"耗时 {stats['elapsed']:.1f}s, {stats['per_second']:.2f} 张/秒, 并发 {stats['workers']}")
+            self.start_sprite_generation()
+    def on_thumbnails_ready(self, batch):
+        for video_path, thumb_path in batch: self.update_button_icon(video_path, thumb_path)
     def update_button_icon(self, video_path, thumb_path):
-        if video_path in self.video_buttons:
-            pixmap = QImage(thumb_path)
-            if pixmap.isNull():
-                print(f"错误：无法从路径加载缩略图文件: {thumb_path}")
-                return
-            self.video_buttons[video_path].setIcon(QIcon(thumb_path))
+        """记录缩略图位置；真正的解码推迟到该行滚动到可见区域时，并在后台线程完成"""
+        with perf_trace.span('thumbnail.set_icon', 'gui'):
+            self.pixmap_cache.set_thumbnail(video_path, thumb_path)
+            self.refresh_video(video_path)
+    def on_metadata_ready(self, batch):
+        for video_path, info in batch:
+            self.library.set_media_info(video_path, info); self.refresh_video(video_path, [DurationRole])
+        self.index_save_timer.start()
+        if self.sprite_worker: self.sprite_worker.enqueue([video_path for video_path, _ in batch])  # 之前因缺少时长跳过的雪碧图
+    def on_thumbnails_decoded(self, batch):
+        with perf_trace.span('thumbnail.insert_decoded', 'gui', count=len(batch)):
+            for video_path, image in batch:
+                if self.pixmap_cache.insert(video_path, image): self.refresh_video(video_path)
+    def refresh_video(self, video_path, roles=(Qt.DecorationRole,)):
+        view = self.category_tabs.get(self.library.category_of(video_path))
+        if view: view.model().refresh(video_path, roles)
+        self.search_model.refresh(video_path, roles)
+    def prewarm_media(self, video_path):
+        if self.player_widget: self.player_widget.prewarm(video_path)
     def play_video(self, video_path):
+        if not self.ensure_player(): return
         self.stacked_widget.setCurrentWidget(self.player_widget)
         self.player_widget.start_playback(video_path)
         self.player_widget.setFocus()  # 让播放器获取焦点
+        self.request_sprite(video_path)
+        # 预先打开前后相邻的视频，连续观看时下一个可以立即开始
+        view = self.category_tabs.get(self.library.category_of(video_path))
+        if view:
+            videos = view.model().videos(); row = videos.index(video_path) if video_path in videos else -1
+            for neighbour in (videos[row + 1:row + 2] + videos[max(row - 1, 0):row]) if row >= 0 else []: self.player_widget.prewarm(neighbour)
     def closeEvent(self, event):
-        if self.thumbnail_worker and self.thumbnail_worker.isRunning(): self.thumbnail_worker.stop(); self.thumbnail_worker.wait()
-        self.player_widget.stop_playback(); event.accept()
+        self.cancel_scan()
+        for scanner in self.findChildren(LibraryScanner): scanner.cancel(); scanner.wait()
+        self.stop_thumbnail_generation(); self.library_watcher.stop()
+        for worker in self._retired_workers: worker.wait()
+        if self._gc_thread: self._gc_thread.join()  # 关闭缓存清单前等清理结束
+        self.thumbnail_decoder.stop(); self.thumbnail_decoder.wait()
+        if self.sprite_worker: self.sprite_worker.stop(); self.sprite_worker.wait()
+        if self.index_save_timer.isActive(): self.index_save_timer.stop(); self.library.save()
+        if self.thumbnail_cache: self.thumbnail_cache.close()
+        if self.player_widget: self.player_widget.stop_playback()
+        if perf_trace.enabled: self.save_perf_trace()
+        event.accept()
+    def enable_perf_trace(self):
+        """开启性能追踪：开始卡顿检测和定期写指标日志"""
+        if perf_trace.enabled: return
+        perf_trace.enable(); perf_trace.name_thread('gui')
+        self.stall_monitor.start(); self.metrics_timer.start()
+        print(f"性能追踪已开启，退出时写入 {get_perf_path('perf_trace.json')}")
+    def save_perf_trace(self):
+        self.stall_monitor.stop(); self.metrics_timer.stop(); self.metrics_log.write()
+        # 启动阶段多数发生在开启追踪之前，导出时按记录的时间补进追踪
+        for name, ms in startup_timeline.marks(): perf_trace.instant(f"startup.{name}", 'startup', startup_timeline.origin() + ms / 1000)
+        try:
+            path = get_perf_path('perf_trace.json'); print(f"性能追踪: 已写入 {perf_trace.export_chrome_trace(path)} 个事件到 {path}")
+        except OSError as e: print(f"写入性能追踪文件失败: {e}")
+    def toggle_perf_overlay(self):
+        if not self.perf_overlay.isHidden(): self.perf_overlay_timer.stop(); self.perf_overlay.hide(); return
+        self.enable_perf_trace(); self.update_perf_overlay()
+        self.perf_overlay.move(self.mapToGlobal(self.rect().topLeft()) + QPoint(30, 30)); self.perf_overlay.show(); self.perf_overlay_timer.start()
+    def update_perf_overlay(self):
+        """浮层内容：各区间的次数/平均/最大/最近耗时，以及计数器和数值"""
+        snap = perf_trace.snapshot()
+        lines = ["性能计数（Ctrl+Shift+F12 关闭）", f"{'区间':<26}{'次数':>8}{'平均ms':>10}{'最大ms':>10}{'最近ms':>10}"]
+        lines += [f"{n:<28}{s['count']:>8}{s['avg_ms']:>10.2f}{s['max_ms']:>10.1f}{s['last_ms']:>10.2f}" for n, s in sorted(snap['spans'].items())]
+        lines += [f"{n:<28}{v:>8}" for n, v in sorted(snap['counters'].items()) + sorted(snap['gauges'].items())]
+        if self.player_widget and self.player_widget.last_ttff_ms is not None: lines.append(f"{'最近首帧耗时':<22}{self.player_widget.last_ttff_ms:>10.0f}ms")
+        self.perf_overlay.setText("\n".join(lines)); self.perf_overlay.adjustSize()
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape and not self.search_edit.isHidden(): self.close_search()
+        elif event.text().strip() and event.text().isprintable() and not event.modifiers() & (Qt.ControlModifier | Qt.AltModifier): self.open_search(event.text())
+        else: super().keyPressEvent(event)
+    def eventFilter(self, obj, event):
+        # 搜索栏中：Esc 关闭搜索，下方向键进入结果网格，回车播放第一个结果
+        if obj is self.search_edit and event.type() == QEvent.KeyPress:
+            if event.key() == Qt.Key_Escape: self.close_search(); return True
+            if event.key() in (Qt.Key_Down, Qt.Key_Return, Qt.Key_Enter) and self.search_model.rowCount():
+                self.search_view.setFocus(); self.search_view.setCurrentIndex(self.search_model.index(0))
+                if event.key() != Qt.Key_Down: self.play_video(self.search_model.videos()[0])
+                return True
+        return super().eventFilter(obj, event)
     def show_error_message(self, message): QMessageBox.critical(self, "错误", message)
     def show_warning_message(self, message): QMessageBox.warning(self, "提醒", message)
     def apply_stylesheet(self):
         self.setStyleSheet("""
-            QStackedWidget, QTabWidget::pane { background: transparent; border: none; } QWidget { color: #FFFFFF; font-family: "Microsoft YaHei UI", SimHei, Arial; } QTabBar { font-size: 16px; font-weight: bold; } QTabBar::tab { background: rgba(0, 50, 100, 0.7); border: 1px solid rgba(255, 255, 255, 0.3); border-bottom: none; color: #DDDDDD; padding: 15px; border-top-left-radius: 8px; border-top-right-radius: 8px; } QTabBar::tab:hover { background: rgba(0, 80, 150, 0.8); } QTabBar::tab:selected { background: rgba(20, 120, 220, 0.8); color: #FFFFFF; border-bottom: 2px solid #FFFFFF; } QToolButton { background-color: rgba(0, 0, 0, 0.5); border: 2px solid rgba(255, 255, 255, 0.2); border-radius: 10px; padding: 8px; color: #FFFFFF; } QToolButton:hover { background-color: rgba(20, 120, 220, 0.5); border-color: rgba(255, 255, 255, 0.8); } PlayerWidget QPushButton { background-color: #0078D7; color: white; border: none; padding: 8px 16px; border-radius: 5px; font-size: 14px; } PlayerWidget QPushButton:hover { background-color: #005A9E; } QPushButton#play_pause_btn { background-color: transparent; border: none; padding: 0px; } QSlider::groove:horizontal { border: 1px solid #4A4A4A; background: #666666; height: 6px; border-radius: 3px; } QSlider::handle:horizontal { background: #FFFFFF; border: 1px solid #FFFFFF; width: 14px; height: 14px; margin: -5px 0; border-radius: 7px; } QSlider::sub-page:horizontal { background: #0078D7; border: 1px solid #4A4A4A; height: 6px; border-radius: 3px; } QScrollBar:vertical { border: none; background: rgba(0,0,0,0.3); width: 12px; margin: 0px; } QScrollBar::handle:vertical { background: rgba(0, 120, 215, 0.7); min-height: 20px; border-radius: 6px; } QScrollBar::handle:vertical:hover { background: rgba(0, 120, 215, 1.0); } QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical { height: 0px; } QMessageBox { background-color: #001f3f; }
+            QStackedWidget, QTabWidget::pane { background: transparent; border: none; } QWidget { color: #FFFFFF; font-family: "Microsoft YaHei UI", SimHei, Arial; } QTabBar { font-size: 16px; font-weight: bold; } QTabBar::tab { background: rgba(0, 50, 100, 0.7); border: 1px solid rgba(255, 255, 255, 0.3); border-bottom: none; color: #DDDDDD; padding: 15px; border-top-left-radius: 8px; border-top-right-radius: 8px; } QTabBar::tab:hover { background: rgba(0, 80, 150, 0.8); } QTabBar::tab:selected { background: rgba(20, 120, 220, 0.8); color: #FFFFFF; border-bottom: 2px solid #FFFFFF; } QToolButton { background-color: rgba(0, 0, 0, 0.5); border: 2px solid rgba(255, 255, 255, 0.2); border-radius: 10px; padding: 8px; color: #FFFFFF; } QToolButton:hover { background-color: rgba(20, 120, 220, 0.5); border-color: rgba(255, 255, 255, 0.8); } PlayerWidget QPushButton { background-color: #0078D7; color: white; border: none; padding: 8px 16px; border-radius: 5px; font-size: 14px; } PlayerWidget QPushButton:hover { background-color: #005A9E; } QPushButton#play_pause_btn { background-color: transparent; border: none; padding: 0px; } QSlider::groove:horizontal { border: 1px solid #4A4A4A; background: #666666; height: 6px; border-radius: 3px; } QSlider::handle:horizontal { background: #FFFFFF; border: 1px solid #FFFFFF; width: 14px; height: 14px; margin: -5px 0; border-radius: 7px; } QSlider::sub-page:horizontal { background: #0078D7; border: 1px solid #4A4A4A; height: 6px; border-radius: 3px; } QScrollBar:vertical { border: none; background: rgba(0,0,0,0.3); width: 12px; margin: 0px; } QScrollBar::handle:vertical { background: rgba(0, 120, 215, 0.7); min-height: 20px; border-radius: 6px; } QScrollBar::handle:vertical:hover { background: rgba(0, 120, 215, 1.0); } QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical { height: 0px; } QMessageBox { background-color: #001f3f; } QLineEdit#search_edit { background: rgba(0, 0, 0, 0.6); border: 1px solid rgba(255, 255, 255, 0.5); border-radius: 8px; padding: 8px 12px; margin-bottom: 10px; font-size: 16px; }
         """)
\ No newline at end of file
@@ -0,0 +1,54 @@
+# media_probe.py
+import json
+
+DEFAULT_SEEK_PERCENT = 0.1   # 缩略图默认取视频时长 10% 处的画面
+KEYFRAME_PROBE_SECONDS = 30  # 只读取开头 30 秒的数据包来估算关键帧间隔
+
+def probe_args(video_path):
+    """ffprobe 参数：一次调用取得时长、码率、分辨率、编码，以及开头一段的关键帧位置（只解复用，不解码）"""
+    return ['-v', 'error', '-select_streams', 'v:0', '-read_intervals', f"%+{KEYFRAME_PROBE_SECONDS}",
+            '-show_entries', 'format=duration,bit_rate:stream=codec_name,width,height:packet=pts_time,flags',
+            '-of', 'json', video_path]
+
+def parse_probe_output(output):
+    """把 ffprobe 的 JSON 输出整理成 {duration, width, height, codec, bitrate, keyint}，缺失的字段为 None"""
+    data = json.loads(output or '{}')
+    fmt = data.get('format', {})
+    stream = (data.get('streams') or [{}])[0]
+
+    def number(value, cast=float):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    keyframes = [number(p.get('pts_time')) for p in data.get('packets', []) if 'K' in p.get('flags', '')]
+    keyframes = sorted(t for t in keyframes if t is not None)
+    gaps = [b - a for a, b in zip(keyframes, keyframes[1:]) if b > a]
+    return {
+        'duration': number(fmt.get('duration')),
+        'width': number(stream.get('width'), int),
+        'height': number(stream.get('height'), int),
+        'codec': stream.get('codec_name'),
+        'bitrate': number(fmt.get('bit_rate'), int),
+        'keyint': sum(gaps) / len(gaps) if gaps else None,
+    }
+
+def thumbnail_seek(info, percent=DEFAULT_SEEK_PERCENT):
+    """根据元数据选取截图位置（秒）：按时长百分比取点并对齐到之前的关键帧；没有元数据时沿用 1 秒"""
+    duration = (info or {}).get('duration')
+    if not duration:
+        return 1.0
+    if duration < 2:
+        return 0.0
+    seek = duration * percent
+    keyint = info.get('keyint')
+    if keyint and keyint < seek:
+        seek = int(seek / keyint) * keyint
+    return seek
+
+def format_duration(seconds):
+    """秒数格式化为 m:ss 或 h:mm:ss"""
+    seconds = int(seconds)
+    h, m, s = seconds // 3600, seconds // 60 % 60, seconds % 60
+    return f"{h}:{m:02}:{s:02}" if h else f"{m}:{s:02}"
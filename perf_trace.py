@@ -0,0 +1,155 @@
+# perf_trace.py
+"""轻量的性能追踪：关键路径上的耗时区间、计数器和界面线程卡顿检测
+
+默认关闭，关闭时 span() 只返回一个共享的空上下文，其余记录函数直接返回。
+打开后事件保存在有界队列中，可导出为 Chrome 追踪格式（chrome://tracing 或 Perfetto 打开），
+并由 MetricsLog 定期把汇总写入滚动的指标日志。
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from PySide2.QtCore import QObject, QTimer
+
+MAX_EVENTS = 200000          # 最多保留的追踪事件数，超出后丢弃最早的
+STALL_THRESHOLD_MS = 16.0    # 界面线程超过一帧没有响应即视为卡顿
+STALL_PROBE_INTERVAL = 8     # 卡顿检测的心跳间隔（ms）
+
+enabled = False
+_events = deque(maxlen=MAX_EVENTS)  # (阶段, 名称, 类别, 开始秒, 时长秒, 线程, 参数)
+_lock = threading.Lock()
+_counters = {}      # 名称 -> 累计数量
+_gauges = {}        # 名称 -> 最新值
+_spans = {}         # 名称 -> [次数, 总秒数, 最大秒数, 最近一次秒数]，启动以来
+_window = {}        # 名称 -> [次数, 总秒数, 最大秒数]，上一次写指标日志以来
+_thread_names = {}
+
+now = time.perf_counter
+
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('name', 'cat', 'args', 'start')
+    def __init__(self, name, cat, args):
+        self.name, self.cat, self.args = name, cat, args
+    def __enter__(self):
+        self.start = now(); return self
+    def __exit__(self, *exc):
+        complete(self.name, self.start, now(), self.cat, **self.args)
+        return False
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+def span(name, cat='app', **args):
+    """with perf_trace.span('名称'): ... 记录一段耗时；关闭时几乎没有开销"""
+    return _Span(name, cat, args) if enabled else _NULL_SPAN
+
+def complete(name, start, end=None, cat='app', **args):
+    """记录一段已知起止时间（perf_counter 秒）的区间，可用于跨线程或事后计算的耗时"""
+    if not enabled: return
+    end = now() if end is None else end
+    duration = max(0.0, end - start)
+    _events.append(('X', name, cat, start, duration, _thread_id(), args))
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None: stats = _spans[name] = [0, 0.0, 0.0, 0.0]
+        stats[0] += 1; stats[1] += duration; stats[2] = max(stats[2], duration); stats[3] = duration
+        window = _window.get(name)
+        if window is None: window = _window[name] = [0, 0.0, 0.0]
+        window[0] += 1; window[1] += duration; window[2] = max(window[2], duration)
+
+def instant(name, cat='app', ts=None, **args):
+    if not enabled: return
+    _events.append(('i', name, cat, now() if ts is None else ts, 0.0, _thread_id(), args))
+
+def count(name, n=1):
+    if not enabled: return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def gauge(name, value):
+    """记录一个随时间变化的数值（如队列深度），在追踪中显示为计数曲线"""
+    if not enabled: return
+    _gauges[name] = value
+    _events.append(('C', name, 'gauge', now(), 0.0, _thread_id(), {name: value}))
+
+def _thread_id():
+    ident = threading.get_ident()
+    if ident not in _thread_names:
+        _thread_names[ident] = threading.current_thread().name
+    return ident
+
+def name_thread(name):
+    """给当前线程起一个在追踪中显示的名字（QThread 在 Python 中没有有意义的线程名）"""
+    if enabled: _thread_names[threading.get_ident()] = name
+
+def snapshot(reset_window=False):
+    """当前的计数器、数值和各区间的统计（毫秒）；reset_window 为 True 时同时开始新的统计窗口"""
+    with _lock:
+        window = {n: {'count': c, 'avg_ms': t / c * 1000, 'max_ms': m * 1000} for n, (c, t, m) in _window.items()}
+        spans = {n: {'count': c, 'avg_ms': t / c * 1000, 'max_ms': m * 1000, 'last_ms': last * 1000}
+                 for n, (c, t, m, last) in _spans.items()}
+        if reset_window: _window.clear()
+        return {'counters': dict(_counters), 'gauges': dict(_gauges), 'spans': spans, 'window': window}
+
+def export_chrome_trace(path):
+    """把已记录的事件写成 Chrome 追踪格式的 JSON 文件"""
+    pid = os.getpid()
+    trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+             for tid, name in list(_thread_names.items())]
+    for ph, name, cat, start, duration, tid, args in list(_events):
+        event = {'name': name, 'cat': cat, 'ph': ph, 'ts': start * 1e6, 'pid': pid, 'tid': tid, 'args': args}
+        if ph == 'X': event['dur'] = duration * 1e6
+        elif ph == 'i': event['s'] = 't'
+        trace.append(event)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return len(trace)
+
+class MetricsLog:
+    """滚动的指标日志：每行一个 JSON 汇总，超过 max_bytes 时把旧日志改名为 .1 后重新开始"""
+    def __init__(self, path, max_bytes=1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def write(self):
+        record = dict(snapshot(reset_window=True), time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        del record['spans']  # 日志只记录本窗口内的统计
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"写入性能指标日志失败: {e}")
+
+class StallMonitor(QObject):
+    """界面线程卡顿检测：心跳定时器的实际间隔比预期长出一帧以上时，记录一次卡顿区间"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._timer = QTimer(self); self._timer.setInterval(STALL_PROBE_INTERVAL)
+        self._timer.timeout.connect(self._beat)
+        self._last = None
+
+    def start(self):
+        self._last = now(); self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def _beat(self):
+        current = now()
+        late_ms = (current - self._last) * 1000 - STALL_PROBE_INTERVAL
+        if late_ms > STALL_THRESHOLD_MS:
+            complete('gui.stall', self._last + STALL_PROBE_INTERVAL / 1000, current, 'gui', late_ms=round(late_ms, 1))
+            count('gui.stalls')
+        self._last = current
@@ -1,11 +1,16 @@
 # player_widget.py
 import os
 import sys
+import time
 import vlc
+from collections import OrderedDict, deque
 from PySide2.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                                QLabel, QSlider, QStyle)
-from PySide2.QtCore import Qt, QSize, Signal, QTimer
-from PySide2.QtGui import QIcon, QKeyEvent
+from PySide2.QtCore import Qt, QSize, QPoint, QRect, Signal, QTimer
+from PySide2.QtGui import QIcon, QKeyEvent, QGuiApplication, QPixmap, QPainter, QColor, QFont
+
+from sprite_sheet import SpriteSheet
+import perf_trace
 
 def get_base_path():
     if getattr(sys, 'frozen', False):
@@ -15,20 +20,84 @@ def get_base_path():
 
 base_path = get_base_path()
 
+def format_ms(ms): return f"{ms//60000:02}:{ms//1000%60:02}"
+
 class ClickableSlider(QSlider):
-    def __init__(self, o): super().__init__(o)
+    """点击即可定位的进度条；按下和拖动只发出 sliderMoved 用于预览，松开鼠标时才按拖到的位置发出 seek_requested"""
+    hovered = Signal(int)         # 鼠标悬停处对应的值
+    hover_left = Signal()
+    seek_requested = Signal(int)
+    def __init__(self, o): super().__init__(o); self.setMouseTracking(True); self._seek_value = None  # 左键按下期间拖到的值
+    def value_at(self, x): return int(self.minimum()+(self.maximum()-self.minimum())*min(max(x,0),self.width())/max(1,self.width()))
+    def is_seeking(self): return self._seek_value is not None or self.isSliderDown()
+    def _drag_to(self, x): self._seek_value=self.value_at(x); self.setValue(self._seek_value); self.sliderMoved.emit(self._seek_value)
+    # 左键不交给 QSlider 处理：点在滑块外时它只会翻页且不算按下，播放进度的刷新会覆盖点到的位置
     def mousePressEvent(self, e):
-        super().mousePressEvent(e)
-        if e.button()==Qt.LeftButton:
-            v=self.minimum()+(self.maximum()-self.minimum())*e.pos().x()/self.width()
-            self.setValue(int(v)); self.sliderMoved.emit(int(v))
+        if e.button()==Qt.LeftButton: self._drag_to(e.pos().x())
+        else: super().mousePressEvent(e)
+    def mouseMoveEvent(self, e):
+        if self._seek_value is not None: self._drag_to(e.pos().x()); return
+        super().mouseMoveEvent(e)
+        if not self.isSliderDown(): self.hovered.emit(self.value_at(e.pos().x()))
+    def mouseReleaseEvent(self, e):
+        if e.button()==Qt.LeftButton and self._seek_value is not None: v, self._seek_value = self._seek_value, None; self.seek_requested.emit(v)
+        else: super().mouseReleaseEvent(e)
+    def leaveEvent(self, e): super().leaveEvent(e); self.hover_left.emit()
+
+class MediaPool:
+    """预先异步解析的 vlc.Media 的 LRU 池：点击播放时直接复用，省去解复用探测和打开文件的等待"""
+    def __init__(self, instance, max_items=8):
+        self.instance = instance
+        self.max_items = max_items
+        self._media = OrderedDict()
+
+    def prewarm(self, path):
+        if path in self._media:
+            self._media.move_to_end(path); return
+        media = self.instance.media_new(path)
+        media.parse_with_options(vlc.MediaParseFlag.local, 5000)  # 异步解析，不阻塞界面
+        self._media[path] = media
+        while len(self._media) > self.max_items:
+            self._media.popitem(last=False)[1].release()
+
+    def take(self, path):
+        """返回 (media, 是否为预解析过的)；池中没有时现场创建"""
+        media = self._media.get(path)
+        if media is not None:
+            self._media.move_to_end(path)
+            return media, True
+        return self.instance.media_new(path), False
 
 class PlayerWidget(QWidget):
     back_to_browser_requested = Signal()
-    def __init__(self):
+    time_to_first_frame = Signal(float, bool)  # 首帧耗时(ms), 是否命中预解析池
+    # 以下信号由 libvlc 的事件线程发出，经排队连接转到 Qt 线程处理
+    _vlc_first_frame = Signal()
+    _vlc_state_changed = Signal()
+    _vlc_end_reached = Signal()
+    def __init__(self, media_pool_size=8, instance=None):
         super().__init__()
-        self.instance = vlc.Instance()
+        self.instance = instance or vlc.Instance()  # 可以传入在后台线程预先创建的实例
         self.player = self.instance.media_player_new()
+        self.media_pool = MediaPool(self.instance, media_pool_size)
+
+        # 首帧耗时：从 start_playback 到视频输出创建（MediaPlayerVout）
+        self._playback_started, self._playback_warm = None, False
+        self.last_ttff_ms, self.ttff_history = None, deque(maxlen=50)
+        self._vlc_first_frame.connect(self._on_first_frame)
+
+        # 播放状态由 libvlc 事件推送；事件线程只记录最新值，界面最多每帧刷新一次
+        self._active, self._ui_pending = False, False
+        self._time_ms, self._length_ms, self._position = 0, 0, 0.0
+        self.current_path, self.sprite = None, None  # 正在播放的视频及其预览雪碧图（生成后由主窗口送来）
+        self._vlc_state_changed.connect(self._schedule_ui_update)
+        self._vlc_end_reached.connect(self.stop_playback)
+        events = self.player.event_manager()
+        events.event_attach(vlc.EventType.MediaPlayerVout, lambda event: self._vlc_first_frame.emit())
+        events.event_attach(vlc.EventType.MediaPlayerTimeChanged, self._on_vlc_time_changed)
+        events.event_attach(vlc.EventType.MediaPlayerPositionChanged, self._on_vlc_position_changed)
+        events.event_attach(vlc.EventType.MediaPlayerLengthChanged, self._on_vlc_length_changed)
+        events.event_attach(vlc.EventType.MediaPlayerEndReached, lambda event: self._vlc_end_reached.emit())
         
         # 修正路径：确保在 _internal 或开发目录中找到 icons
         icon_path = os.path.join(base_path, 'icons')
@@ -39,7 +108,8 @@ class PlayerWidget(QWidget):
             self.play_icon, self.pause_icon = self.style().standardIcon(QStyle.SP_MediaPlay), self.style().standardIcon(QStyle.SP_MediaPause)
 
         self.init_ui()
-        self.timer = QTimer(self); self.timer.setInterval(200); self.timer.timeout.connect(self.update_ui)
+        refresh_rate = QGuiApplication.primaryScreen().refreshRate() or 60
+        self.ui_timer = QTimer(self); self.ui_timer.setSingleShot(True); self.ui_timer.setInterval(max(1, int(1000 / refresh_rate))); self.ui_timer.timeout.connect(self.update_ui)
         self.setFocusPolicy(Qt.StrongFocus)  # 允许获取焦点
     
     def init_ui(self):
@@ -49,23 +119,66 @@ class PlayerWidget(QWidget):
         ctrl_layout=QHBoxLayout(ctrl_bar); ctrl_layout.setContentsMargins(10,5,10,5)
         self.back_btn=QPushButton("返回列表"); self.back_btn.clicked.connect(self.request_back)
         self.play_pause_btn=QPushButton(); self.play_pause_btn.setObjectName("play_pause_btn"); self.play_pause_btn.setIcon(self.play_icon); self.play_pause_btn.setIconSize(QSize(24,24)); self.play_pause_btn.setFixedSize(QSize(40,40)); self.play_pause_btn.clicked.connect(self.toggle_play_pause)
-        self.pos_slider=ClickableSlider(Qt.Horizontal); self.pos_slider.setRange(0,1000); self.pos_slider.sliderMoved.connect(self.set_position)
+        self.pos_slider=ClickableSlider(Qt.Horizontal); self.pos_slider.setRange(0,1000); self.pos_slider.sliderMoved.connect(self.show_preview); self.pos_slider.hovered.connect(self.show_preview); self.pos_slider.hover_left.connect(self.hide_preview); self.pos_slider.seek_requested.connect(self.set_position)
+        # 拖动预览：浮在视频画面之上的提示窗口，显示雪碧图中的对应帧和时间；真正的跳转等松开鼠标后才进行
+        self.preview_label=QLabel(self, Qt.ToolTip); self.preview_label.setAttribute(Qt.WA_ShowWithoutActivating); self.preview_label.setStyleSheet("background:#000000;border:1px solid rgba(255,255,255,0.6);"); self.preview_label.hide()
+        self.preview_font=QFont("Microsoft YaHei", 10)
         self.time_label=QLabel("--:-- / --:--"); self.time_label.setStyleSheet("color:#FFFFFF;background:transparent;")
         ctrl_layout.addWidget(self.back_btn); ctrl_layout.addSpacing(10); ctrl_layout.addWidget(self.play_pause_btn); ctrl_layout.addWidget(self.pos_slider); ctrl_layout.addWidget(self.time_label); ctrl_layout.setStretchFactor(self.pos_slider,1)
         main_layout.addWidget(self.video_frame,1); main_layout.addWidget(ctrl_bar,0)
+    def prewarm(self, path): self.media_pool.prewarm(path)
+    def set_sprite(self, path, sheet_path):
+        if path == self.current_path: self.sprite = SpriteSheet.load(sheet_path)
+    def show_preview(self, value):
+        """在进度条上方显示 value 处的预览帧和时间；还没有雪碧图时只显示时间"""
+        if not self._length_ms: return
+        ms = self._length_ms * value // 1000; frame = self.sprite.frame_at(ms / 1000) if self.sprite else None
+        w, h = (frame.width(), frame.height()) if frame is not None else (80, 0)
+        pixmap = QPixmap(w, h + 24); pixmap.fill(QColor('#000000')); painter = QPainter(pixmap)
+        if frame is not None: painter.drawImage(0, 0, frame)
+        painter.setFont(self.preview_font); painter.setPen(QColor('#FFFFFF')); painter.drawText(QRect(0, h, w, 24), Qt.AlignCenter, format_ms(ms)); painter.end()
+        self.preview_label.setPixmap(pixmap); self.preview_label.adjustSize()
+        anchor = self.pos_slider.mapToGlobal(QPoint(self.pos_slider.width() * value // 1000, 0))
+        self.preview_label.move(anchor.x() - self.preview_label.width() // 2, anchor.y() - self.preview_label.height() - 12); self.preview_label.show()
+    def hide_preview(self): self.preview_label.hide()
+    def _on_first_frame(self):
+        if self._playback_started is None: return
+        perf_trace.complete('playback.ttff', self._playback_started, cat='playback', warm=self._playback_warm)
+        self.last_ttff_ms = (time.perf_counter() - self._playback_started) * 1000; self._playback_started = None
+        self.ttff_history.append((self.last_ttff_ms, self._playback_warm))
+        print(f"首帧耗时: {self.last_ttff_ms:.0f}ms ({'预解析' if self._playback_warm else '未预解析'})")
+        self.time_to_first_frame.emit(self.last_ttff_ms, self._playback_warm)
     def start_playback(self, p):
-        m=self.instance.media_new(p); self.player.set_media(m); self.player.set_hwnd(self.video_frame.winId()); self.player.play(); self.play_pause_btn.setIcon(self.pause_icon); self.timer.start()
+        self._playback_started = time.perf_counter(); perf_trace.instant('playback.start', 'playback', video=p)
+        if p != self.current_path: self.current_path, self.sprite = p, None
+        # 先清零再开始播放：play() 期间 libvlc 线程可能已经发出 LengthChanged（只发一次），之后再清零会把时长抹掉
+        self._time_ms, self._length_ms, self._position = 0, 0, 0.0; self._active, self._ui_pending = True, False
+        m, self._playback_warm = self.media_pool.take(p); self.player.set_media(m); self.player.set_hwnd(self.video_frame.winId()); self.player.play(); self.play_pause_btn.setIcon(self.pause_icon)
     def stop_playback(self):
         if self.player.is_playing(): self.player.stop()
-        self.timer.stop(); self.time_label.setText("--:-- / --:--"); self.pos_slider.setValue(0); self.play_pause_btn.setIcon(self.play_icon)
+        # 取消尚未执行的刷新时一并清除待刷新标记，否则之后的事件再也不会触发刷新
+        self._active, self._ui_pending = False, False; self.ui_timer.stop(); self.hide_preview(); self.time_label.setText("--:-- / --:--"); self.pos_slider.setValue(0); self.play_pause_btn.setIcon(self.play_icon)
     def toggle_play_pause(self):
         if self.player.is_playing(): self.player.pause(); self.play_pause_btn.setIcon(self.play_icon)
         else: self.player.play(); self.play_pause_btn.setIcon(self.pause_icon)
     def set_position(self, pos): self.player.set_position(pos/1000.0)
+    def _on_vlc_time_changed(self, event): self._time_ms = event.u.new_time; self._notify_ui()
+    def _on_vlc_position_changed(self, event): self._position = event.u.new_position; self._notify_ui()
+    def _on_vlc_length_changed(self, event): self._length_ms = event.u.new_length; self._notify_ui()
+    def _notify_ui(self):
+        # 在 libvlc 线程中调用：已有待处理的刷新时不再重复发信号
+        if not self._ui_pending: self._ui_pending = True; self._vlc_state_changed.emit()
+    def _schedule_ui_update(self):
+        if not self.ui_timer.isActive(): self.ui_timer.start()
     def update_ui(self):
-        pos=self.player.get_position(); self.pos_slider.setValue(int(pos*1000)); total_ms=self.player.get_length(); curr_ms=self.player.get_time()
-        if total_ms>0: total=f"{total_ms//60000:02}:{total_ms//1000%60:02}"; curr=f"{curr_ms//60000:02}:{curr_ms//1000%60:02}"; self.time_label.setText(f"{curr} / {total}")
-        if self.player.get_state()==vlc.State.Ended: self.stop_playback()
+        self._ui_pending = False
+        if not self._active: return
+        pos = int(self._position * 1000)
+        if pos != self.pos_slider.value() and not self.pos_slider.is_seeking(): self.pos_slider.setValue(pos)
+        total_ms, curr_ms = self._length_ms, self._time_ms
+        if total_ms>0:
+            text=f"{format_ms(curr_ms)} / {format_ms(total_ms)}"
+            if text != self.time_label.text(): self.time_label.setText(text)
     def request_back(self): self.back_to_browser_requested.emit(); self.stop_playback()
     def keyPressEvent(self, event: QKeyEvent):
         if event.key() == Qt.Key_Escape:
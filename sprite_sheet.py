@@ -0,0 +1,65 @@
+# sprite_sheet.py
+import json
+import math
+from PySide2.QtCore import QRect
+from PySide2.QtGui import QImage
+
+from thumbnail_cache import sprite_index_path
+
+SPRITE_INTERVAL = 10       # 默认每 10 秒取一帧
+SPRITE_MAX_FRAMES = 200    # 长视频相应加大取帧间隔，一张雪碧图最多 200 帧
+SPRITE_COLUMNS = 10
+SPRITE_TILE_WIDTH = 160
+SPRITE_KEY_SUFFIX = '-sprite'  # 雪碧图的缓存键 = 视频缓存键 + 后缀
+
+def sprite_layout(info, interval=SPRITE_INTERVAL):
+    """根据 ffprobe 元数据决定取帧间隔和拼图布局；没有时长时返回 None（无法预先确定帧数）"""
+    duration = (info or {}).get('duration')
+    if not duration:
+        return None
+    interval = max(interval, duration / SPRITE_MAX_FRAMES)
+    count = max(1, math.ceil(duration / interval))
+    width, height = info.get('width'), info.get('height')
+    tile_height = 2 * round(SPRITE_TILE_WIDTH * height / width / 2) if width and height else 90
+    columns = min(SPRITE_COLUMNS, count)
+    return {'interval': interval, 'count': count, 'columns': columns, 'rows': math.ceil(count / columns),
+            'tile': [SPRITE_TILE_WIDTH, max(2, tile_height)]}
+
+def sprite_args(video_path, layout, output_path):
+    """ffmpeg 参数：只解码关键帧，一遍读完整个视频，按间隔取帧、缩小后拼成一张图"""
+    w, h = layout['tile']
+    return ['-y', '-loglevel', 'error', '-skip_frame', 'nokey', '-i', video_path, '-an', '-sn',
+            '-vf', f"fps=1/{layout['interval']:.3f}:round=up,scale={w}:{h},tile={layout['columns']}x{layout['rows']}",
+            '-frames:v', '1', '-q:v', '5', output_path]
+
+def write_index(sheet_path, layout):
+    with open(sprite_index_path(sheet_path), 'w', encoding='utf-8') as f:
+        json.dump(layout, f)
+
+class SpriteSheet:
+    """一张雪碧图及其索引；图片在第一次取帧时才读入内存"""
+    def __init__(self, sheet_path, layout):
+        self.sheet_path = sheet_path
+        self.layout = layout
+        self._image = None
+
+    @classmethod
+    def load(cls, sheet_path):
+        """读取索引文件，失败时返回 None"""
+        try:
+            with open(sprite_index_path(sheet_path), 'r', encoding='utf-8') as f:
+                return cls(sheet_path, json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"读取预览图索引失败: {e}")
+            return None
+
+    def frame_at(self, seconds):
+        """返回 seconds 处的预览帧（QImage），图片无法读取时返回 None"""
+        if self._image is None:
+            self._image = QImage(self.sheet_path)
+        if self._image.isNull():
+            return None
+        layout = self.layout
+        index = min(max(round(seconds / layout['interval']), 0), layout['count'] - 1)  # 第 k 帧取自 k × 间隔处
+        w, h = layout['tile']
+        return self._image.copy(QRect(index % layout['columns'] * w, index // layout['columns'] * h, w, h))
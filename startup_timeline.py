@@ -0,0 +1,22 @@
+# startup_timeline.py
+import time
+
+# 以本模块被导入的时刻作为起点，main.py 最先导入它
+_t0 = time.perf_counter()
+_marks = []
+
+def mark(name):
+    """记录一个启动阶段距起点的毫秒数，同名阶段只记录第一次"""
+    if any(n == name for n, _ in _marks):
+        return
+    _marks.append((name, (time.perf_counter() - _t0) * 1000))
+
+def marks():
+    return list(_marks)
+
+def origin():
+    """起点的 time.perf_counter() 值，用于把各阶段换算成绝对时间"""
+    return _t0
+
+def report():
+    print("启动时间线: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in _marks))
@@ -0,0 +1,226 @@
+# thumbnail_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_BUDGET_BYTES = 512 * 1024 * 1024  # 默认缓存上限 512MB
+MANIFEST_NAME = 'manifest.sqlite3'
+THUMBNAIL_SIZE = (250, 140)  # 缩略图按显示尺寸生成，另有一张 2 倍尺寸的高分屏版本
+KIND_THUMBNAIL = 'thumb'     # 条目类型：缩略图
+KIND_SPRITE = 'sprite'       # 条目类型：拖动进度条时的预览雪碧图，与缩略图共用缓存预算
+COMMIT_BATCH = 64      # 清单的改动攒够这么多条，或距上次写入超过 COMMIT_INTERVAL 秒时才提交一次
+COMMIT_INTERVAL = 2.0
+UNKNOWN_FILE_MAX_AGE = 24 * 3600  # 清单之外的文件（包括生成中的 .part 临时文件）超过一天仍未登记才视为残留
+
+def hidpi_path(thumb_path):
+    """缩略图对应的高分屏版本路径：xxx.jpg -> xxx@2x.jpg"""
+    root, ext = os.path.splitext(thumb_path)
+    return f"{root}@2x{ext}"
+
+def sprite_index_path(sheet_path):
+    """雪碧图对应的索引文件路径：xxx.jpg -> xxx.json"""
+    return os.path.splitext(sheet_path)[0] + '.json'
+
+def entry_paths(path, kind=KIND_THUMBNAIL):
+    """一个缓存条目包含的全部文件：缩略图附带高分屏版本，雪碧图附带索引"""
+    return [path, sprite_index_path(path) if kind == KIND_SPRITE else hidpi_path(path)]
+
+def cache_key(video_path, size, mtime_ns):
+    """由视频的完整路径、文件大小和修改时间计算缓存键，视频被替换后键随之改变"""
+    raw = f"{os.path.normcase(os.path.abspath(video_path))}\0{size}\0{mtime_ns}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+class ThumbnailCache:
+    """带持久化清单和 LRU 淘汰的缩略图缓存
+
+    清单保存在缓存目录下的 SQLite 数据库中，启动时一次性读入内存，
+    之后查询缓存不再需要逐个检查缩略图文件是否存在。
+    预览雪碧图也登记在同一清单中（kind 列区分），与缩略图一起按 LRU 淘汰。
+
+    内存中的清单由 _lock 保护，界面线程绘制时查询缓存也要取得它，因此持有 _lock 时只改内存、
+    把要执行的 SQL 记下来；写入数据库和提交（可能要等磁盘同步）在 _db_lock 下批量进行。
+    """
+    def __init__(self, cache_dir, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.cache_dir = cache_dir
+        self.budget_bytes = int(budget_bytes)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._db_lock = threading.Lock()  # 需要两把锁时先取 _db_lock 再取 _lock
+        self._conn = sqlite3.connect(os.path.join(cache_dir, MANIFEST_NAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时同步磁盘；断电最多丢失最近几次提交，缺的缩略图重新生成即可
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, video_path TEXT NOT NULL, file TEXT NOT NULL,
+            bytes INTEGER NOT NULL, last_access REAL NOT NULL, kind TEXT NOT NULL DEFAULT 'thumb')""")
+        if 'kind' not in {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN kind TEXT NOT NULL DEFAULT 'thumb'")
+        self._conn.commit()
+
+        # 键 -> [视频路径, 文件名, 字节数, 最近访问时间, 类型]，按访问时间从旧到新排列，淘汰时从头取
+        self._entries = OrderedDict((row[0], list(row[1:])) for row in self._conn.execute(
+            "SELECT key, video_path, file, bytes, last_access, kind FROM entries ORDER BY last_access"))
+        self._by_video = {(e[0], e[4]): k for k, e in self._entries.items()}
+        self._total_bytes = sum(e[2] for e in self._entries.values())
+        self._touched = set()
+        self._pending_sql, self._last_sync = [], time.monotonic()  # 尚未写入数据库的 (语句, 参数列表)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def key_for(self, video_path, size=None, mtime_ns=None):
+        """返回视频对应的缓存键；未提供大小和修改时间时读取文件状态"""
+        if size is None or mtime_ns is None:
+            st = os.stat(video_path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        return cache_key(video_path, size, mtime_ns)
+
+    def lookup(self, key):
+        """命中时返回缩略图（或雪碧图）路径并刷新访问时间，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry[3] = time.time(); self._touched.add(key)
+            self._entries.move_to_end(key)
+            return os.path.join(self.cache_dir, entry[1])
+
+    def path_for(self, key):
+        """新缩略图应写入的位置"""
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def store(self, key, video_path, thumb_path, kind=KIND_THUMBNAIL):
+        """登记一个刚生成的缩略图或雪碧图，同一视频的同类旧条目会被替换，超出预算时按 LRU 淘汰"""
+        size = sum(os.path.getsize(p) for p in entry_paths(thumb_path, kind) if os.path.exists(p))
+        with self._lock:
+            old_key = self._by_video.get((video_path, kind))
+            if old_key is not None and old_key != key:
+                self._remove([old_key])
+            if key in self._entries:
+                self._total_bytes -= self._entries[key][2]
+            self._entries[key] = [video_path, os.path.basename(thumb_path), size, time.time(), kind]
+            self._entries.move_to_end(key)
+            self._by_video[(video_path, kind)] = key
+            self._total_bytes += size
+            self._pending_sql.append(("INSERT OR REPLACE INTO entries (key, video_path, file, bytes, last_access, kind) VALUES (?, ?, ?, ?, ?, ?)",
+                                      [(key, video_path, os.path.basename(thumb_path), size, self._entries[key][3], kind)]))
+            self._touched.discard(key)
+            self._evict(keep=key)
+            due = len(self._pending_sql) >= COMMIT_BATCH or time.monotonic() - self._last_sync >= COMMIT_INTERVAL
+        if due:
+            self._sync()
+
+    def rename(self, old_video_path, new_video_path, old_key, new_key):
+        """视频改名（大小和修改时间不变）：它的缩略图和雪碧图条目改登记到新路径和新键下，文件本身不动
+
+        old_key、new_key 为改名前后按 key_for 算出的键，雪碧图等派生条目的键保留原来的后缀。返回转移的条目数。
+        """
+        moved = 0
+        with self._lock:
+            for kind in (KIND_THUMBNAIL, KIND_SPRITE):
+                key = self._by_video.get((old_video_path, kind))
+                if key is None or not key.startswith(old_key):
+                    continue
+                target = new_key + key[len(old_key):]
+                stale = [k for k in (target, self._by_video.get((new_video_path, kind))) if k is not None and k != key]
+                self._remove(stale)
+                entry = self._entries.pop(key); entry[0] = new_video_path
+                del self._by_video[(old_video_path, kind)]
+                self._entries[target] = entry; self._by_video[(new_video_path, kind)] = target
+                if key in self._touched: self._touched.discard(key); self._touched.add(target)
+                self._pending_sql.append(("UPDATE entries SET key = ?, video_path = ? WHERE key = ?", [(target, new_video_path, key)]))
+                moved += 1
+        if moved:
+            self._sync()
+        return moved
+
+    def _evict(self, keep=None):
+        if self._total_bytes <= self.budget_bytes:
+            return
+        victims = []
+        over = self._total_bytes - self.budget_bytes
+        for k, e in self._entries.items():
+            if over <= 0:
+                break
+            if k == keep:
+                continue
+            victims.append(k); over -= e[2]
+        self._remove(victims)
+
+    def _remove(self, keys):
+        for k in keys:
+            entry = self._entries.pop(k, None)
+            if entry is None:
+                continue
+            self._total_bytes -= entry[2]
+            if self._by_video.get((entry[0], entry[4])) == k:
+                del self._by_video[(entry[0], entry[4])]
+            self._touched.discard(k)
+            for path in entry_paths(os.path.join(self.cache_dir, entry[1]), entry[4]):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if keys:
+            self._pending_sql.append(("DELETE FROM entries WHERE key = ?", [(k,) for k in keys]))
+
+    def collect_garbage(self, live_videos=()):
+        """清理孤立条目：视频已不存在的条目、文件丢失的条目以及清单之外的文件
+
+        live_videos 中的视频视为仍然存在，不再逐个检查。读取目录和检查视频是否存在都不持有锁，
+        可以与生成缩略图同时进行：清单之外但还很新的文件可能刚写完、尚未登记，暂不删除。返回删除的条目数。
+        """
+        live_videos = set(live_videos)
+        with self._lock:
+            entries = dict(self._entries)  # 先取清单快照再读目录：快照里的条目文件一定已经写好
+        files = set(os.listdir(self.cache_dir))
+        dead = {k: e for k, e in entries.items()
+                if e[1] not in files or (e[0] not in live_videos and not os.path.exists(e[0]))}
+        with self._lock:
+            # 检查期间被改名或重新生成的条目不再删除
+            dead = [k for k, e in dead.items() if self._entries.get(k) is e]
+            self._remove(dead)
+            known = {name for e in self._entries.values() for name in entry_paths(e[1], e[4])}
+        self._sync()
+        now = time.time()
+        for name in files:
+            if name.startswith(MANIFEST_NAME) or name in known:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.path.getmtime(path) < UNKNOWN_FILE_MAX_AGE:
+                    continue
+                os.remove(path)
+            except OSError:
+                pass
+        return len(dead)
+
+    def _sync(self):
+        """把记下的改动写入清单并提交；不持有 _lock，期间查询缓存不受磁盘同步影响"""
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending_sql, self._last_sync = self._pending_sql, [], time.monotonic()
+            if not pending:
+                return
+            for sql, rows in pending:
+                self._conn.executemany(sql, rows)
+            self._conn.commit()
+
+    def flush(self):
+        """把累积的访问时间和尚未提交的改动批量写回清单"""
+        with self._lock:
+            if self._touched:
+                self._pending_sql.append(("UPDATE entries SET last_access = ? WHERE key = ?",
+                                          [(self._entries[k][3], k) for k in self._touched if k in self._entries]))
+                self._touched.clear()
+        self._sync()
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
@@ -0,0 +1,116 @@
+# title_search.py
+import os
+import unicodedata
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import islice
+
+try:  # 可选依赖：有 pypinyin 时拼音首字母更准确（多音字、GB2312 二级汉字）
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+# GB2312 一级汉字按拼音排序，每个声母的第一个汉字的 GBK 编码
+_GBK_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'), (0xB7A2, 'f'),
+    (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'), (0xC0AC, 'l'), (0xC2E8, 'm'),
+    (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'), (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'),
+    (0xCBFA, 't'), (0xCDDA, 'w'), (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'),
+]
+_GBK_CODES = [code for code, _ in _GBK_INITIALS]
+_GBK_LAST = 0xD7F9  # 一级汉字的最后一个
+KEY_SEPARATOR = '\x01'  # 检索键中标题与拼音首字母之间的分隔符，不会出现在文件名里
+MAX_RESULTS = 1000  # 搜索结果最多显示的条数
+
+def normalize_title(text):
+    """统一全角/半角并忽略大小写"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+def _gbk_initial(char):
+    try:
+        data = char.encode('gbk')
+    except UnicodeEncodeError:
+        return ''
+    if len(data) != 2:
+        return ''
+    code = data[0] << 8 | data[1]
+    if not _GBK_CODES[0] <= code <= _GBK_LAST:
+        return ''  # 二级汉字按部首排序，查不出声母
+    return _GBK_INITIALS[bisect_right(_GBK_CODES, code) - 1][1]
+
+def pinyin_initials(text):
+    """拼音首字母串：汉字取首字母，字母和数字原样保留，其余字符忽略，如 "第3课 光的折射" -> "d3kgdzs" """
+    if lazy_pinyin is not None:
+        parts = lazy_pinyin(text, style=Style.FIRST_LETTER)
+        return ''.join(c for c in ''.join(parts).casefold() if c.isalnum())
+    result = []
+    for char in text:
+        if char.isascii():
+            if char.isalnum(): result.append(char)
+        elif '一' <= char <= '鿿':
+            result.append(_gbk_initial(char))
+        elif char.isalnum():
+            result.append(char)
+    return ''.join(result)
+
+class TitleIndex:
+    """所有视频标题的内存索引，按标题或拼音首字母做前缀/子串匹配
+
+    每个视频的检索键是规范化标题，含汉字时再接上“分隔符 + 拼音首字母”（其余标题的首字母就是标题本身去掉符号，
+    不再重复）。倒排表按单个字符和相邻两个字符建立，都不跨越分隔符：一两个字的查询直接取倒排表，不必逐个确认；
+    更长的查询先取其中最少见的两字组合对应的视频作为候选，再逐个确认子串，输入是上一次查询的延续时候选直接取上一次的结果。
+    标题或首字母以查询开头的视频另有按首字符的倒排表，排序时不必遍历全部结果。
+    """
+    def __init__(self):
+        self._cache = {}  # 视频路径 -> (检索键, 单字和两字组合, 首字符)，重建时只为新出现的视频计算
+        # (视频路径列表, 检索键列表, 单字和两字组合 -> 视频序号列表, 标题和首字母的首字符 -> 视频序号列表)
+        self._state = ([], [], {}, {})
+        self._last = (None, '', [])  # (索引状态, 查询, 结果序号)
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def build(self, video_paths):
+        """重建索引；可以在后台线程调用，完成时一次性替换，查询总是看到完整的一份索引"""
+        cache, paths, keys, postings, firsts = {}, [], [], defaultdict(list), defaultdict(list)
+        for i, path in enumerate(video_paths):
+            entry = self._cache.get(path)
+            if entry is None:
+                title = normalize_title(os.path.splitext(os.path.basename(path))[0])
+                initials = pinyin_initials(title)
+                key = title if initials == ''.join(c for c in title if c.isalnum()) else title + KEY_SEPARATOR + initials
+                parts, grams = key.split(KEY_SEPARATOR), set()
+                for part in parts:
+                    grams.update(part); grams.update(map(str.__add__, part, part[1:]))
+                entry = (key, tuple(grams), tuple({part[0] for part in parts if part}))
+            cache[path] = entry
+            key, grams, first_chars = entry
+            for gram in grams:
+                postings[gram].append(i)
+            for char in first_chars:
+                firsts[char].append(i)
+            paths.append(path); keys.append(key)
+        self._cache, self._state = cache, (paths, keys, dict(postings), dict(firsts))
+
+    def search(self, query, limit=MAX_RESULTS):
+        """返回匹配的视频路径，最多 limit 个：标题或首字母以查询开头的排在前面，其余子串匹配的在后，各自保持库中的顺序"""
+        query = normalize_title(query).strip().replace(KEY_SEPARATOR, '')
+        if not query:
+            return []
+        state = self._state
+        paths, keys, postings, firsts = state
+        if len(query) <= 2:
+            hits = postings.get(query, [])
+        else:
+            candidates = min((postings.get(query[j:j + 2], ()) for j in range(len(query) - 1)), key=len)
+            last_state, last_query, last_hits = self._last
+            if last_state is state and last_query and query.startswith(last_query) and len(last_hits) < len(candidates):
+                candidates = last_hits
+            hits = [i for i in candidates if query in keys[i]]
+        self._last = (state, query, hits)
+        # 以查询开头的一定也是子串匹配：只需在首字符相同的视频里找，凑够 limit 个就停
+        prefix = list(islice((i for i in firsts.get(query[0], ())
+                              if keys[i].startswith(query) or keys[i].startswith(query, keys[i].find(KEY_SEPARATOR) + 1)), limit))
+        seen = set(prefix)
+        rest = islice((i for i in hits if i not in seen), limit - len(prefix))
+        return [paths[i] for i in prefix] + [paths[i] for i in rest]
@@ -0,0 +1,211 @@
+# video_grid.py
+import os
+from collections import OrderedDict
+from PySide2.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from PySide2.QtCore import Qt, QSize, QRect, QPoint, QModelIndex, QAbstractListModel, Signal
+from PySide2.QtGui import QPixmap, QPainter, QColor, QPen, QFont, QFontMetrics
+
+from thumbnail_cache import THUMBNAIL_SIZE
+from media_probe import format_duration
+
+ICON_SIZE = QSize(*THUMBNAIL_SIZE)
+ITEM_SIZE = QSize(270, 200)
+GRID_SIZE = QSize(300, 230)  # 卡片之间保留 30px 间距
+VideoPathRole = Qt.UserRole + 1
+DurationRole = Qt.UserRole + 2
+
+class PixmapCache:
+    """缩略图的有界 LRU 缓存：只记录缩略图文件路径，真正显示到的条目才交给 loader 在后台解码"""
+    def __init__(self, max_items=200, loader=None, resolver=None):
+        self.max_items = max_items
+        self.loader = loader      # loader(视频路径, 缩略图路径)，解码结果通过 insert() 送回
+        self.resolver = resolver  # resolver(视频路径) -> 缩略图路径或 None，没有登记过的视频第一次显示时才去查
+        self._thumb_paths = {}    # 视频路径 -> 缩略图路径，解码失败的为 None（不再重试）
+        self._pixmaps = OrderedDict()
+        self._loading = set()
+
+    def set_thumbnail(self, video_path, thumb_path):
+        self._thumb_paths[video_path] = thumb_path
+        self._pixmaps.pop(video_path, None); self._loading.discard(video_path)
+
+    def forget(self, video_path):
+        self._thumb_paths.pop(video_path, None)
+        self._pixmaps.pop(video_path, None); self._loading.discard(video_path)
+
+    def clear(self):
+        self._thumb_paths.clear(); self._pixmaps.clear(); self._loading.clear()
+
+    def pixmap(self, video_path):
+        """命中时返回 QPixmap；未命中时发起后台解码并返回 None"""
+        pixmap = self._pixmaps.get(video_path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(video_path)
+            return pixmap
+        if video_path not in self._thumb_paths and self.resolver:
+            thumb_path = self.resolver(video_path)
+            if thumb_path: self._thumb_paths[video_path] = thumb_path
+        thumb_path = self._thumb_paths.get(video_path)
+        if thumb_path is not None and video_path not in self._loading and self.loader:
+            self._loading.add(video_path)
+            self.loader(video_path, thumb_path)
+        return None
+
+    def insert(self, video_path, image):
+        """放入后台解码好的 QImage（失败时为 None），返回是否需要重绘该行"""
+        self._loading.discard(video_path)
+        if video_path not in self._thumb_paths:
+            return False
+        if image is None:
+            self._thumb_paths[video_path] = None
+            return False
+        self._pixmaps[video_path] = QPixmap.fromImage(image)
+        while len(self._pixmaps) > self.max_items:
+            self._pixmaps.popitem(last=False)
+        return True
+
+class VideoListModel(QAbstractListModel):
+    """一个分类中的视频列表，缩略图通过 PixmapCache 按需取得，时长等信息通过 media_info(路径) 查询"""
+    def __init__(self, pixmap_cache, media_info=None, parent=None):
+        super().__init__(parent)
+        self.pixmap_cache = pixmap_cache
+        self.media_info = media_info
+        self._videos, self._rows = [], {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._videos)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        video_path = self._videos[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.splitext(os.path.basename(video_path))[0]
+        if role == Qt.DecorationRole:
+            return self.pixmap_cache.pixmap(video_path)
+        if role == VideoPathRole:
+            return video_path
+        if role == DurationRole:
+            duration = ((self.media_info and self.media_info(video_path)) or {}).get('duration')
+            return format_duration(duration) if duration else None
+        return None
+
+    def videos(self):
+        return self._videos
+
+    def set_videos(self, videos, reset=False):
+        """更新为新的（已排序的）视频列表，只增删有变化的行；reset 为 True 时整体替换（如搜索结果）"""
+        if reset or not self._videos or not videos:
+            self.beginResetModel(); self._videos = list(videos); self.endResetModel()
+        else:
+            keep = set(videos)
+            for row in reversed(range(len(self._videos))):
+                if self._videos[row] not in keep:
+                    self.beginRemoveRows(QModelIndex(), row, row); del self._videos[row]; self.endRemoveRows()
+            existing = set(self._videos)
+            for row, video_path in enumerate(videos):
+                if video_path not in existing:
+                    self.beginInsertRows(QModelIndex(), row, row); self._videos.insert(row, video_path); self.endInsertRows()
+        self._rows = {p: i for i, p in enumerate(self._videos)}
+
+    def refresh(self, video_path, roles=(Qt.DecorationRole,)):
+        """缩略图或元数据就绪后只重绘对应的一行"""
+        row = self._rows.get(video_path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, list(roles))
+
+class VideoItemDelegate(QStyledItemDelegate):
+    """按原来的 QToolButton 样式绘制视频卡片：缩略图在上，标题在下"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font = QFont("Microsoft YaHei", 11)
+        self.badge_font = QFont("Microsoft YaHei", 9)
+
+    def sizeHint(self, option, index):
+        return ITEM_SIZE
+
+    def paint(self, painter, option, index):
+        painter.save(); painter.setRenderHint(QPainter.Antialiasing)
+        rect = QRect(QPoint(0, 0), ITEM_SIZE); rect.moveCenter(option.rect.center())
+        highlighted = bool(option.state & (QStyle.State_MouseOver | QStyle.State_HasFocus))
+        painter.setPen(QPen(QColor(255, 255, 255, 204 if highlighted else 51), 2))
+        painter.setBrush(QColor(20, 120, 220, 128) if highlighted else QColor(0, 0, 0, 128))
+        painter.drawRoundedRect(rect.adjusted(1, 1, -1, -1), 10, 10)
+
+        inner = rect.adjusted(10, 10, -10, -10)  # 2px 边框 + 8px 内边距
+        icon_rect = QRect(inner.left(), inner.top(), inner.width(), ICON_SIZE.height())
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None:
+            target = QRect(QPoint(0, 0), pixmap.size() / pixmap.devicePixelRatio()); target.moveCenter(icon_rect.center())
+            painter.drawPixmap(target, pixmap)
+        duration = index.data(DurationRole)
+        if duration:
+            # 时长角标画在缩略图右下角
+            painter.setFont(self.badge_font)
+            badge = QFontMetrics(self.badge_font).boundingRect(duration).adjusted(-6, -2, 6, 2)
+            badge.moveBottomRight(icon_rect.bottomRight() - QPoint(4, 4))
+            painter.setPen(Qt.NoPen); painter.setBrush(QColor(0, 0, 0, 170))
+            painter.drawRoundedRect(badge, 4, 4)
+            painter.setPen(QColor('#FFFFFF')); painter.drawText(badge, Qt.AlignCenter, duration)
+
+        text_rect = QRect(inner.left(), icon_rect.bottom() + 6, inner.width(), inner.bottom() - icon_rect.bottom() - 6)
+        painter.setFont(self.font); painter.setPen(QColor('#FFFFFF'))
+        text = QFontMetrics(self.font).elidedText(index.data(Qt.DisplayRole), Qt.ElideRight, text_rect.width())
+        painter.drawText(text_rect, Qt.AlignHCenter | Qt.AlignVCenter, text)
+        painter.restore()
+
+class VideoGridView(QListView):
+    """图标模式的视频网格，只绘制可见的行，控件数量与视频数量无关"""
+    video_activated = Signal(str)
+    video_hovered = Signal(str)  # 鼠标悬停或键盘焦点移到某个视频上，可用于预先打开媒体
+    text_typed = Signal(str)     # 直接输入的文字，交给搜索栏而不是在本网格内跳转
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(VideoItemDelegate(self))
+        self.setViewMode(QListView.IconMode); self.setResizeMode(QListView.Adjust); self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True); self.setGridSize(GRID_SIZE); self.setWrapping(True)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel); self.verticalScrollBar().setSingleStep(30)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.NoSelection); self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setMouseTracking(True)
+        self.setStyleSheet("background: transparent; border: none;")
+        self.placeholder_text = "此分类下没有视频文件。"
+        self.clicked.connect(self._on_clicked)
+        self.entered.connect(self._on_hovered)
+        self.selectionModel().currentChanged.connect(self._on_hovered)
+
+    def _on_hovered(self, index):
+        if index.isValid():
+            self.video_hovered.emit(index.data(VideoPathRole))
+
+    def _on_clicked(self, index):
+        self.video_activated.emit(index.data(VideoPathRole))
+
+    def keyboardSearch(self, text):
+        self.text_typed.emit(text)
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter) and self.currentIndex().isValid():
+            self._on_clicked(self.currentIndex())
+        else:
+            super().keyPressEvent(event)
+
+    def visible_videos(self):
+        """根据网格尺寸和滚动位置直接算出可见的视频，不需要逐行查询几何信息"""
+        videos = self.model().videos()
+        if not videos:
+            return []
+        columns = max(1, self.viewport().width() // GRID_SIZE.width())
+        top = self.verticalScrollBar().value()
+        first = top // GRID_SIZE.height() * columns
+        last = ((top + self.viewport().height()) // GRID_SIZE.height() + 1) * columns
+        return videos[first:last]
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.model().rowCount() == 0:
+            painter = QPainter(self.viewport())
+            painter.setPen(QColor('#FFFFFF')); painter.setFont(QFont("Microsoft YaHei", 11))
+            painter.drawText(self.viewport().rect(), Qt.AlignCenter, self.placeholder_text)
@@ -1,58 +1,451 @@
 # workers.py
 import os
 import sys
-from PySide2.QtCore import QThread, Signal, QProcess
+import time
+import heapq
+import threading
+from collections import OrderedDict
+from PySide2.QtCore import QThread, Signal, QProcess, QSize
+from PySide2.QtGui import QImageReader
+
+from thumbnail_cache import THUMBNAIL_SIZE, KIND_SPRITE, hidpi_path
+from media_probe import DEFAULT_SEEK_PERCENT, probe_args, parse_probe_output, thumbnail_seek
+from sprite_sheet import SPRITE_KEY_SUFFIX, sprite_layout, sprite_args, write_index
+import perf_trace
+
+# 任务优先级：数值越小越先处理
+PRIORITY_VISIBLE = 0       # 当前标签页中可见的按钮
+PRIORITY_CURRENT_TAB = 1   # 当前标签页中的其他按钮
+PRIORITY_BACKGROUND = 2    # 其他标签页
+
+FFMPEG_TIMEOUT = 30.0      # 单个 ffmpeg 进程的超时时间（秒）
+SPRITE_TIMEOUT = 600.0     # 生成雪碧图要读完整个视频，超时时间放宽到 10 分钟
+STATS_INTERVAL = 1.0       # 吞吐量统计的上报间隔（秒）
+FLUSH_INTERVAL = 0.016     # 结果按帧（约 16ms）合并后再发给界面线程
+POLL_INTERVAL_MS = 5       # 没有进程结束时，两轮检查之间等待的毫秒数
+
+def default_worker_count():
+    """默认的并发进程数：与 CPU 核心数一致"""
+    return max(1, os.cpu_count() or 1)
 
 class ThumbnailWorker(QThread):
-    thumbnail_ready = Signal(str, str)
+    thumbnails_ready = Signal(list)  # [(视频路径, 缩略图路径)]
+    metadata_ready = Signal(list)    # [(视频路径, ffprobe 元数据)]
     error_occurred = Signal(str)
+    stats_updated = Signal(dict)
 
-    def __init__(self, video_files, cache_dir, ffmpeg_path):
+    def __init__(self, video_files, cache, ffmpeg_path, max_workers=None, ffprobe_path=None,
+                 seek_percent=DEFAULT_SEEK_PERCENT, library=None):
         super().__init__()
         self.video_files = video_files
-        self.cache_dir = cache_dir
+        self.cache = cache
         self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.media_info = {}  # 本次用 ffprobe 读到的元数据；其余的取自 library，都没有时先运行 ffprobe
+        # 可选的 LibraryIndex：直接用其中记录的大小、修改时间和元数据，不再逐个读取文件状态
+        self.library = library
+        self.seek_percent = seek_percent
+        self.max_workers = max(1, int(max_workers or default_worker_count()))
         self._is_running = True
-        
+
+        # 待处理任务：路径 -> 原始顺序；队列为按 (优先级, 原始顺序) 排列的最小堆
+        self._lock = threading.Lock()
+        self._pending = {p: i for i, p in enumerate(video_files)}
+        # 开启性能追踪时记录入队时间，用来区分排队等待和 ffmpeg 实际运行的耗时
+        self._enqueued_at = dict.fromkeys(video_files, perf_trace.now()) if perf_trace.enabled else {}
+        self._queue = [(PRIORITY_BACKGROUND, i, p) for p, i in self._pending.items()]
+        heapq.heapify(self._queue)
+        self._next_order, self._closed = len(self._pending), False
+        self._stats = {'generated': 0, 'cached': 0, 'failed': 0, 'probed': 0}
+        self._started_at = None
+        self._outbox, self._meta_outbox, self._last_flush = [], [], 0.0
+
+    def set_focus(self, tab_files=(), visible_files=()):
+        """根据当前选中的标签页和可见按钮调整待处理任务的优先级"""
+        tab_files, visible_files = set(tab_files), set(visible_files)
+        with self._lock:
+            self._queue = [(PRIORITY_VISIBLE if p in visible_files else PRIORITY_CURRENT_TAB if p in tab_files else PRIORITY_BACKGROUND, i, p)
+                           for p, i in self._pending.items()]
+            heapq.heapify(self._queue)
+
+    def enqueue(self, video_files):
+        """向正在运行的任务追加视频；线程已经结束（或即将结束）时返回 False"""
+        with self._lock:
+            if self._closed:
+                return False
+            for p in video_files:
+                if p in self._pending: continue
+                self._pending[p] = self._next_order
+                heapq.heappush(self._queue, (PRIORITY_BACKGROUND, self._next_order, p))
+                self._next_order += 1
+                if perf_trace.enabled: self._enqueued_at[p] = perf_trace.now()
+            return True
+
+    def _take_next(self):
+        with self._lock:
+            while self._queue:
+                _, _, p = heapq.heappop(self._queue)
+                if self._pending.pop(p, None) is not None:
+                    return p
+            return None
+
+    def stats(self):
+        """返回当前吞吐量统计：已生成/命中缓存/失败数量、每秒缩略图数、队列深度"""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            stats = dict(self._stats, queue_depth=len(self._pending))
+        stats['elapsed'] = elapsed
+        stats['per_second'] = stats['generated'] / elapsed if elapsed > 0 else 0.0
+        stats['workers'] = self.max_workers
+        return stats
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
     def run(self):
-        for p in self.video_files:
-            if not self._is_running:
-                break
-            
-            try:
-                base_name = os.path.basename(p)
-                thumbnail_name = f"{os.path.splitext(base_name)[0]}.jpg"
-                thumbnail_path = os.path.join(self.cache_dir, thumbnail_name)
-                
-                if os.path.exists(thumbnail_path):
-                    self.thumbnail_ready.emit(p, thumbnail_path)
-                    continue
-                
-                process = QProcess()
-                process.setProcessChannelMode(QProcess.MergedChannels)
-                
-                command = self.ffmpeg_path
-                args = ['-y', '-ss', '00:00:01', '-i', p, '-vframes', '1', '-q:v', '2', thumbnail_path]
-                
-                process.start(command, args)
-                if not process.waitForFinished(30000): # 30秒超时
-                    process.kill()
-                    raise RuntimeError("FFmpeg process timed out.")
-                
-                exit_code = process.exitCode()
-                if exit_code != 0:
-                    error_output = process.readAllStandardError().data().decode('utf-8', errors='ignore')
-                    raise RuntimeError(f"FFmpeg failed with exit code {exit_code}:\n{error_output}")
-
-                if os.path.exists(thumbnail_path):
-                    self.thumbnail_ready.emit(p, thumbnail_path)
+        perf_trace.name_thread('thumbnail-worker')
+        self._started_at = time.monotonic()
+        last_report = self._started_at
+        active = {}  # 视频路径 -> (阶段, 进程, 缓存键, 临时输出路径, 启动时间)
+
+        while self._is_running:
+            # 1. 填满空闲的进程槽位
+            while len(active) < self.max_workers and self._is_running:
+                p = self._take_next()
+                if p is None:
+                    break
+                job = self._start_job(p)
+                if job:
+                    active[p] = job
                 else:
-                    raise IOError(f"FFmpeg ran successfully but thumbnail file was not created for {p}")
+                    # 缓存命中时会连续处理大量视频：每处理一个就让出 GIL，界面线程不必等满一个切换间隔
+                    time.sleep(0)
+
+            if not active:
+                with self._lock:
+                    if not self._pending:
+                        self._closed = True
+                        break
+                continue
+
+            # 2. 逐个检查正在运行的进程（不阻塞），都还没结束时整轮只等一次：
+            #    逐个 waitForFinished 会让一轮最长耗时为进程数 × 超时，结束的槽位要等这么久才补上
+            finished_any = False
+            for p, (stage, process, key, tmp_path, started) in list(active.items()):
+                if not self._is_running:
+                    break
+                if process.waitForFinished(0):
+                    del active[p]; finished_any = True
+                    if perf_trace.enabled:
+                        end = perf_trace.now()
+                        perf_trace.complete(f"ffmpeg.{stage}", end - (time.monotonic() - started), end, 'thumbnail', video=p)
+                    if stage == 'probe':
+                        # 元数据到手后在同一个槽位里接着截图
+                        self._finish_probe(p, process)
+                        job = self._start_job(p)
+                        if job:
+                            active[p] = job
+                    else:
+                        self._finish_job(p, process, key, tmp_path)
+                elif time.monotonic() - started > FFMPEG_TIMEOUT:
+                    del active[p]; finished_any = True
+                    process.kill(); process.waitForFinished(1000)
+                    if stage == 'probe':
+                        print(f"读取视频信息超时: {p}")
+                        self.media_info[p] = {}
+                        job = self._start_job(p)
+                        if job:
+                            active[p] = job
+                    else:
+                        self._discard(tmp_path)
+                        self._report_error(p, RuntimeError("FFmpeg process timed out."))
+
+            if not finished_any and self._is_running:
+                QThread.msleep(POLL_INTERVAL_MS)
+
+            now = time.monotonic()
+            if (self._outbox or self._meta_outbox) and now - self._last_flush >= FLUSH_INTERVAL:
+                self._flush()
+            if now - last_report >= STATS_INTERVAL:
+                last_report = now
+                self.stats_updated.emit(self.stats())
+
+        # 停止时立即结束所有仍在运行的 ffmpeg 进程
+        for stage, process, _, tmp_path, _ in active.values():
+            process.kill(); process.waitForFinished(1000)
+            if tmp_path: self._discard(tmp_path)
+        self._flush()
+        self.cache.flush()
+        stats = self.stats(); stats['finished'] = True
+        self.stats_updated.emit(stats)
+
+    def _start_process(self, program, args, channel_mode=QProcess.MergedChannels):
+        process = QProcess()
+        process.setProcessChannelMode(channel_mode)
+        process.start(program, args)
+        if not process.waitForStarted(5000):
+            raise RuntimeError(f"{os.path.basename(program)} failed to start: {process.errorString()}")
+        return process
+
+    def _start_job(self, p):
+        """启动视频的下一个阶段：缺少元数据时先运行 ffprobe，否则（缓存未命中时）运行 ffmpeg 截图"""
+        queued_at = self._enqueued_at.pop(p, None)
+        if queued_at is not None: perf_trace.complete('thumbnail.queue_wait', queued_at, cat='thumbnail', video=p)
+        try:
+            info = self.media_info.get(p)
+            if info is None and self.library is not None:
+                info = self.library.media_info(p)
+            if self.ffprobe_path and info is None:
+                process = self._start_process(self.ffprobe_path, probe_args(p), QProcess.SeparateChannels)
+                return 'probe', process, None, None, time.monotonic()
+
+            stat = self.library.stat(p) if self.library is not None else None
+            key = self.cache.key_for(p, *stat) if stat else self.cache.key_for(p)
+            if self.cache.lookup(key):
+                # 已有缩略图的视频不再发给界面线程：网格绘制到该行时会自己查缓存清单
+                self._count('cached'); perf_trace.count('thumbnail.cached')
+                return None
+
+            # 先写入临时文件，完成后再改名，避免留下半截的缩略图
+            tmp_path = self.cache.path_for(key)[:-len('.jpg')] + '.part.jpg'
+
+            # 按时长百分比取关键帧对齐的截图位置；多个进程并行时，单帧解码无需 ffmpeg 再开多线程；
+            # 一次解码同时输出显示尺寸和 2 倍尺寸（高分屏）两张缩略图
+            seek = thumbnail_seek(info, self.seek_percent)
+            w, h = THUMBNAIL_SIZE
+            scale = "scale={}:{}:force_original_aspect_ratio=decrease"
+            args = ['-y', '-loglevel', 'error', '-threads', '1', '-ss', f"{seek:.3f}", '-i', p, '-an',
+                    '-filter_complex', f"[0:v]split=2[a][b];[a]{scale.format(w, h)}[s1];[b]{scale.format(w * 2, h * 2)}[s2]",
+                    '-map', '[s1]', '-frames:v', '1', '-q:v', '2', tmp_path,
+                    '-map', '[s2]', '-frames:v', '1', '-q:v', '2', hidpi_path(tmp_path)]
+
+            process = self._start_process(self.ffmpeg_path, args)
+            return 'thumb', process, key, tmp_path, time.monotonic()
+        except Exception as e:
+            self._report_error(p, e)
+            return None
+
+    def _finish_probe(self, p, process):
+        info = {}
+        try:
+            if process.exitCode() != 0:
+                raise RuntimeError(process.readAllStandardError().data().decode('utf-8', errors='ignore').strip())
+            info = parse_probe_output(process.readAllStandardOutput().data().decode('utf-8', errors='ignore'))
+            self._count('probed')
+        except Exception as e:
+            # 读取失败不影响截图，按无元数据处理
+            print(f"读取视频信息失败: {p}\n{e}")
+        self.media_info[p] = info
+        self._meta_outbox.append((p, info))
+
+    def _finish_job(self, p, process, key, tmp_path):
+        try:
+            exit_code = process.exitCode()
+            if exit_code != 0:
+                error_output = process.readAll().data().decode('utf-8', errors='ignore')
+                raise RuntimeError(f"FFmpeg failed with exit code {exit_code}:\n{error_output}")
+
+            if os.path.exists(tmp_path):
+                thumbnail_path = self.cache.path_for(key)
+                os.replace(tmp_path, thumbnail_path)
+                if os.path.exists(hidpi_path(tmp_path)):
+                    os.replace(hidpi_path(tmp_path), hidpi_path(thumbnail_path))
+                self.cache.store(key, p, thumbnail_path)
+                self._count('generated'); perf_trace.count('thumbnail.generated')
+                self._outbox.append((p, thumbnail_path))
+            else:
+                raise IOError(f"FFmpeg ran successfully but thumbnail file was not created for {p}")
+        except Exception as e:
+            self._discard(tmp_path)
+            self._report_error(p, e)
+
+    def _flush(self):
+        if self._meta_outbox:
+            batch, self._meta_outbox = self._meta_outbox, []
+            self.metadata_ready.emit(batch)
+        if self._outbox:
+            batch, self._outbox = self._outbox, []
+            self.thumbnails_ready.emit(batch)
+        self._last_flush = time.monotonic()
+
+    def _discard(self, path):
+        for candidate in (path, hidpi_path(path)):
+            try:
+                os.remove(candidate)
+            except OSError:
+                pass
+
+    def _report_error(self, p, e):
+        self._count('failed'); perf_trace.count('thumbnail.failed')
+        error_message = f"无法为视频生成缩略图:\n{os.path.basename(p)}\n\n错误: {e}"
+        print(error_message)
+        self.error_occurred.emit(error_message)
+
+    def stop(self):
+        """停止生成：丢弃排队中的任务，正在运行的进程会在下一次轮询时被立即结束"""
+        self._is_running = False
+        with self._lock:
+            self._closed = True
+            self._pending.clear(); self._queue.clear()
+
+class ThumbnailDecoder(QThread):
+    """在后台线程中解码并校验缩略图，结果按帧合并后以 QImage 形式送回界面线程"""
+    images_ready = Signal(list)  # [(视频路径, QImage，解码失败时为 None)]
+
+    def __init__(self, device_pixel_ratio=1.0):
+        super().__init__()
+        self.device_pixel_ratio = max(1.0, device_pixel_ratio)
+        self._cond = threading.Condition()
+        self._requests = {}  # 视频路径 -> 缩略图路径，后请求的先解码（通常是刚滚动到的行）
+        self._is_running = True
+
+    def request(self, video_path, thumb_path):
+        with self._cond:
+            self._requests.pop(video_path, None)
+            self._requests[video_path] = thumb_path
+            self._cond.notify()
+
+    def run(self):
+        perf_trace.name_thread('thumbnail-decoder')
+        batch, last_flush = [], time.monotonic()
+        while True:
+            with self._cond:
+                while self._is_running and not self._requests and not batch:
+                    self._cond.wait()
+                if not self._is_running:
+                    return
+                item = self._requests.popitem() if self._requests else None
+            if item:
+                with perf_trace.span('thumbnail.decode', 'thumbnail'):
+                    batch.append((item[0], self.decode(item[1])))
+            if batch and (item is None or time.monotonic() - last_flush >= FLUSH_INTERVAL):
+                self.images_ready.emit(batch)
+                batch, last_flush = [], time.monotonic()
+
+    def decode(self, thumb_path):
+        """优先读取高分屏版本；比显示尺寸大的旧缩略图在解码时直接缩小"""
+        ratio = self.device_pixel_ratio
+        w, h = THUMBNAIL_SIZE
+        for candidate in ([hidpi_path(thumb_path)] if ratio > 1 else []) + [thumb_path]:
+            reader = QImageReader(candidate)
+            size = reader.size()
+            if not size.isValid():
+                continue
+            fit = min(1.0, w * ratio / size.width(), h * ratio / size.height())
+            if fit < 1.0:
+                reader.setScaledSize(QSize(int(size.width() * fit), int(size.height() * fit)))
+            image = reader.read()
+            if image.isNull():
+                continue
+            image.setDevicePixelRatio(max(1.0, min(ratio, image.width() / w, image.height() / h)))
+            return image
+        print(f"错误：无法从路径加载缩略图文件: {thumb_path}")
+        return None
+
+    def stop(self):
+        with self._cond:
+            self._is_running = False
+            self._requests.clear()
+            self._cond.notify()
+
+class SpriteWorker(QThread):
+    """在后台依次为视频生成拖动进度条用的预览雪碧图，一次只运行一个 ffmpeg
+
+    雪碧图要读完整个视频，作为缩略图之后的低优先级阶段预先生成；播放期间暂停（与播放器争抢读取同一块磁盘），
+    正在生成的会被中止并放回队首。播放时请求的视频只是排到队首。文件状态和元数据取自 library，
+    还没有元数据的视频先跳过，等元数据读到后重新排队。
+    """
+    sprite_ready = Signal(str, str)  # 视频路径, 雪碧图路径
+
+    def __init__(self, cache, ffmpeg_path, library=None):
+        super().__init__()
+        self.cache = cache
+        self.ffmpeg_path = ffmpeg_path
+        self.library = library
+        self._cond = threading.Condition()
+        self._requests = OrderedDict()  # 待处理的视频路径，从队首取
+        self._is_running, self._paused = True, False
+
+    def enqueue(self, video_paths):
+        """把视频排到队尾；已在队列中的保持原位"""
+        with self._cond:
+            for p in video_paths: self._requests.setdefault(p)
+            self._cond.notify()
+
+    def request(self, video_path):
+        """把视频提到队首，下一个就处理它"""
+        with self._cond:
+            self._requests[video_path] = None; self._requests.move_to_end(video_path, last=False)
+            self._cond.notify()
+
+    def clear(self):
+        """丢弃排队中的请求（换了视频库）"""
+        with self._cond:
+            self._requests.clear()
+
+    def set_paused(self, paused):
+        with self._cond:
+            self._paused = paused
+            self._cond.notify()
+
+    def run(self):
+        perf_trace.name_thread('sprite-worker')
+        while True:
+            with self._cond:
+                while self._is_running and (self._paused or not self._requests):
+                    self._cond.wait()
+                if not self._is_running:
+                    return
+                video_path, _ = self._requests.popitem(last=False)
+            with perf_trace.span('sprite.generate', 'sprite', video=video_path):
+                self.generate(video_path)
+
+    def generate(self, p):
+        info = self.library.media_info(p) if self.library is not None else None
+        layout = sprite_layout(info)
+        if layout is None:
+            return  # 还没有时长：元数据读到后会重新排队
+        tmp_path = None
+        try:
+            stat = self.library.stat(p) if self.library is not None else None
+            key = (self.cache.key_for(p, *stat) if stat else self.cache.key_for(p)) + SPRITE_KEY_SUFFIX
+            sheet_path = self.cache.lookup(key)
+            if sheet_path:
+                self.sprite_ready.emit(p, sheet_path); return
+            sheet_path = self.cache.path_for(key)
+            tmp_path = sheet_path[:-len('.jpg')] + '.part.jpg'
+            process = QProcess()
+            process.setProcessChannelMode(QProcess.MergedChannels)
+            process.start(self.ffmpeg_path, sprite_args(p, layout, tmp_path))
+            if not process.waitForStarted(5000):
+                raise RuntimeError(f"Failed to start ffmpeg: {process.errorString()}")
+            started = time.monotonic()
+            while not process.waitForFinished(100):
+                if not self._is_running or self._paused or time.monotonic() - started > SPRITE_TIMEOUT:
+                    process.kill(); process.waitForFinished(1000)
+                    if self._paused and self._is_running: self.request(p)  # 开始播放了：恢复后从头再来
+                    elif self._is_running: raise RuntimeError("FFmpeg process timed out.")
+                    self._discard(tmp_path); return
+            if process.exitCode() != 0 or not os.path.exists(tmp_path):
+                raise RuntimeError(process.readAll().data().decode('utf-8', errors='ignore'))
+            write_index(sheet_path, layout)
+            os.replace(tmp_path, sheet_path)
+            self.cache.store(key, p, sheet_path, KIND_SPRITE)
+            self.sprite_ready.emit(p, sheet_path)
+        except Exception as e:
+            print(f"无法生成预览图: {os.path.basename(p)}\n{e}")
+            if tmp_path: self._discard(tmp_path)
 
-            except Exception as e:
-                error_message = f"无法为视频生成缩略图:\n{os.path.basename(p)}\n\n错误: {e}"
-                print(error_message)
-                self.error_occurred.emit(error_message)
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
     def stop(self):
-        self._is_running = False
\ No newline at end of file
+        """丢弃排队中的请求，正在运行的 ffmpeg 会被立即结束"""
+        with self._cond:
+            self._is_running = False
+            self._requests.clear()
+            self._cond.notify()